@@ -0,0 +1,269 @@
+# asset loading helpers shared by the sun scripts
+
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from mipmap import MipChain
+
+CACHE_FOLDER = ".cache"
+CACHE_MAGIC = b"SUNFRAMS"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<8sII")  # magic, version, json length
+CACHE_ALIGN = 4096  # keep pixel data page aligned so it maps cleanly
+
+# frombuffer/tobytes format names keyed by the byte offset of each channel
+_FORMATS = {
+    (0, 1, 2, 3): "RGBA",
+    (2, 1, 0, 3): "BGRA",
+    (1, 2, 3, 0): "ARGB",
+}
+
+
+def display_pixel_format():
+    # Work out which byte order convert_alpha() produces on this display so
+    # cached pixels can be mapped straight into display-format surfaces.
+    probe = pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha()
+    masks = probe.get_masks()
+    offsets = []
+    for mask in masks:
+        shift = (mask & -mask).bit_length() - 1
+        byte = shift // 8
+        if sys.byteorder == "big":
+            byte = 3 - byte
+        offsets.append(byte)
+    return _FORMATS.get(tuple(offsets), "RGBA")
+
+
+def list_frame_files(folder):
+    return sorted(f for f in os.listdir(folder) if f.endswith('.png'))
+
+
+def sun_frame_cache_key(folder, image_files, size, pixel_format):
+    # Any change to a source file (name, size, mtime) or to the target size
+    # produces a different key and forces a rebuild.
+    fingerprint = []
+    for name in image_files:
+        stat = os.stat(os.path.join(folder, name))
+        fingerprint.append([name, stat.st_size, stat.st_mtime_ns])
+    blob = json.dumps([fingerprint, size, pixel_format, CACHE_VERSION]).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()
+
+
+def sun_frame_cache_path(folder, size):
+    name = f"{os.path.basename(os.path.normpath(folder))}-{size}.bin"
+    return os.path.join(CACHE_FOLDER, name)
+
+
+def _read_cache(path, key):
+    # Returns (header, mmap) for a valid cache file or None
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        raw = f.read(CACHE_HEADER.size)
+        if len(raw) != CACHE_HEADER.size:
+            return None
+        magic, version, header_len = CACHE_HEADER.unpack(raw)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION:
+            return None
+        try:
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        except ValueError:
+            return None
+        if header.get("key") != key:
+            return None
+        expected = header["offset"] + header["count"] * header["width"] * header["height"] * 4
+        if os.fstat(f.fileno()).st_size < expected:
+            return None
+        # ACCESS_COPY gives writable, private pages so surfaces can wrap them
+        # without ever touching the file on disk
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    return header, mapped
+
+
+def _write_cache(path, key, frames, size, pixel_format):
+    header = {
+        "key": key,
+        "count": len(frames),
+        "width": size,
+        "height": size,
+        "format": pixel_format,
+    }
+    # Offset depends on the header length, so size the header with a
+    # placeholder first and then round up to the alignment boundary.
+    header["offset"] = 0
+    header_len = len(json.dumps(header).encode("utf-8")) + 16
+    offset = -(-(CACHE_HEADER.size + header_len) // CACHE_ALIGN) * CACHE_ALIGN
+    header["offset"] = offset
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_len)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, header_len))
+        f.write(header_bytes)
+        f.write(b"\0" * (offset - f.tell()))
+        for frame in frames:
+            f.write(pygame.image.tobytes(frame, pixel_format))
+    # atomic swap so a crash mid-write never leaves a half-written cache
+    os.replace(tmp_path, path)
+
+
+def _map_frames(header, mapped):
+    width = header["width"]
+    height = header["height"]
+    frame_bytes = width * height * 4
+    view = memoryview(mapped)
+    frames = []
+    for i in range(header["count"]):
+        start = header["offset"] + i * frame_bytes
+        frames.append(pygame.image.frombuffer(view[start:start + frame_bytes], (width, height), header["format"]))
+    return frames
+
+
+def _load_scaled_frame(path, size):
+    img = pygame.image.load(path)
+    img = pygame.transform.smoothscale(img, (size, size))
+    return img.convert_alpha()
+
+
+def load_sun_frames(folder, size, use_cache=True, workers=4):
+    # Loads every PNG in folder scaled to size x size. The scaled, display
+    # format pixels are kept in a memory-mappable cache file so later launches
+    # skip PNG decoding and smoothscale entirely. Requires a display mode.
+    image_files = list_frame_files(folder)
+    pixel_format = display_pixel_format()
+    key = sun_frame_cache_key(folder, image_files, size, pixel_format)
+    path = sun_frame_cache_path(folder, size)
+
+    if use_cache:
+        cached = _read_cache(path, key)
+        if cached is not None:
+            header, mapped = cached
+            if header["count"] == len(image_files):
+                return _map_frames(header, mapped)
+            mapped.close()
+
+    # Cache miss: decode and scale in parallel, pygame drops the GIL for both
+    paths = [os.path.join(folder, name) for name in image_files]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(_load_scaled_frame, paths, [size] * len(paths)))
+
+    if use_cache:
+        try:
+            _write_cache(path, key, frames, size, pixel_format)
+        except OSError as e:
+            print(f"Could not write sun frame cache: {e}")
+    return frames
+
+
+def load_earth_stage(path, load_size, display_size):
+    img = pygame.image.load(path)
+    # First scale to high resolution
+    img = pygame.transform.smoothscale(img, (load_size, load_size)).convert_alpha()
+    # Mip chain for zooming, the display version is one of its sizes
+    mips = MipChain(img)
+    return {
+        'high_res': img,
+        'display': mips.sample(display_size),
+        'mips': mips
+    }
+
+
+class AssetLoader:
+    # Runs loading jobs on a small pool of worker threads. pygame releases the
+    # GIL while decoding and scaling images, so jobs overlap with each other
+    # and with the render loop. Lower priority numbers are started first.
+    def __init__(self, workers=None):
+        self.workers = workers or 4
+        self._queue = []
+        self._results = {}
+        self._errors = {}
+        self._pending = set()
+        self._total = 0
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"asset-loader-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, name, func, *args, priority=0, **kwargs):
+        with self._cond:
+            heapq.heappush(self._queue, (priority, self._seq, name, func, args, kwargs))
+            self._seq += 1
+            self._pending.add(name)
+            self._total += 1
+            self._cond.notify()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                _, _, name, func, args, kwargs = heapq.heappop(self._queue)
+            try:
+                result = func(*args, **kwargs)
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+            with self._cond:
+                if error is None:
+                    self._results[name] = result
+                else:
+                    self._errors[name] = error
+                self._pending.discard(name)
+                self._cond.notify_all()
+
+    def ready(self, name):
+        with self._cond:
+            return name not in self._pending
+
+    def progress(self):
+        # Fraction of submitted jobs that have finished, 1.0 when idle
+        with self._cond:
+            if self._total == 0:
+                return 1.0
+            return 1 - len(self._pending) / self._total
+
+    def get(self, name, timeout=None):
+        # Blocks until the named job is done. Errors raised by the job are
+        # re-raised here, on the caller's thread.
+        with self._cond:
+            if not self._cond.wait_for(lambda: name not in self._pending, timeout):
+                raise TimeoutError(f"Asset '{name}' is still loading")
+            if name in self._errors:
+                raise self._errors[name]
+            return self._results[name]
+
+    def take(self, name, timeout=None):
+        # get(), and forget the job so its result isn't kept alive here
+        with self._cond:
+            if not self._cond.wait_for(lambda: name not in self._pending, timeout):
+                raise TimeoutError(f"Asset '{name}' is still loading")
+            error = self._errors.pop(name, None)
+            result = self._results.pop(name, None)
+        if error is not None:
+            raise error
+        return result
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify_all()
@@ -0,0 +1,134 @@
+# headless frame-time benchmark support for sun-game.py
+#
+#   python sun-game.py --benchmark bench.json
+#
+# runs the game under SDL's dummy video driver with a virtual clock, scripted
+# sensor input and no frame cap, walks through every state and writes
+# per-state frame time and allocation percentiles as JSON.
+
+import json
+import time
+import tracemalloc
+
+import pygame
+
+from sensors import SensorBuffer
+
+BENCH_FPS = 60            # virtual frame rate the game clock advances at
+TITLE_FRAMES = 120        # how long to sit on the title screen
+GAME_OVER_FRAMES = 240    # how long to let the explosion run
+
+# raw sensor values (gx gy gz) as the ESP32 prints them
+STABLE_INPUT = (0, 0, 2000)      # spins at TARGET_SPIN_SPEED, no drift
+UNSTABLE_INPUT = (200000, 0, 2000)  # drift blows past DRIFT_SUPER_MAX
+
+
+class VirtualClock:
+    # Stands in for pygame.time.get_ticks so animations advance by exactly one
+    # frame per loop, however long the frame actually took to render.
+    def __init__(self, fps=BENCH_FPS, start=1000):
+        self.step = 1000 / fps
+        self.now = start
+
+    def get_ticks(self):
+        return self.now
+
+    def advance(self):
+        self.now += self.step
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(values[-1], 3) if values else 0.0,
+    }
+
+
+class Benchmark:
+    # Drives the game loop: call frame() once at the top of every loop
+    # iteration. It closes the timing of the previous frame, advances the
+    # virtual clock and injects key presses / sensor input for the script:
+    #   pass 1: title -> rising -> intro -> play (stable) -> final zoom -> title
+    #   pass 2: title -> rising -> intro -> play (unstable) -> game over
+    def __init__(self, state_names, title_state, play_state, game_over_state, track_allocations=True):
+        self.state_names = state_names
+        self.title_state = title_state
+        self.play_state = play_state
+        self.game_over_state = game_over_state
+        self.clock = VirtualClock()
+        self.sensors = SensorBuffer(3)  # stands in for the serial reader thread
+        self.frame_times = {}
+        self.allocations = {}
+        self.track_allocations = track_allocations
+        self.run = 1
+        self.state_frames = 0
+        self.prev_state = None
+        self.frame_start = None
+        self.done = False
+        if track_allocations:
+            tracemalloc.start()
+
+    def frame(self, state):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            name = self.state_names[self.prev_state]
+            self.frame_times.setdefault(name, []).append((now - self.frame_start) * 1000)
+            if self.track_allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                self.allocations.setdefault(name, []).append((peak - self.alloc_start) / 1024)
+
+        if state != self.prev_state:
+            if state == self.title_state and self.prev_state is not None:
+                self.run = 2  # came back round from the final zoom
+            self.state_frames = 0
+        self.state_frames += 1
+        self.prev_state = state
+
+        if state == self.title_state and self.state_frames == TITLE_FRAMES:
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+        if state == self.play_state:
+            # One scripted sample per frame, stamped with the virtual clock
+            values = STABLE_INPUT if self.run == 1 else UNSTABLE_INPUT
+            self.sensors.push(self.clock.get_ticks() / 1000, values)
+        if state == self.game_over_state and self.state_frames >= GAME_OVER_FRAMES:
+            self.done = True
+
+        self.clock.advance()
+        if self.track_allocations:
+            tracemalloc.reset_peak()
+            self.alloc_start = tracemalloc.get_traced_memory()[0]
+        self.frame_start = time.perf_counter()
+
+    def report(self):
+        states = {}
+        for name, times in self.frame_times.items():
+            states[name] = {
+                "frames": len(times),
+                "frame_ms": summarize(times),
+            }
+            if name in self.allocations:
+                states[name]["alloc_kb"] = summarize(self.allocations[name])
+        return {
+            "virtual_fps": BENCH_FPS,
+            "alloc_tracking": self.track_allocations,
+            "states": states,
+        }
+
+    def write_report(self, path):
+        report = json.dumps(self.report(), indent=2)
+        if path == '-':
+            print(report)
+        else:
+            with open(path, 'w') as f:
+                f.write(report + "\n")
+            print(f"Wrote benchmark report to {path}")
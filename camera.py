@@ -0,0 +1,56 @@
+# 2D camera for zoomed scenes
+#
+# Instead of drawing the whole scene into a screen-sized surface and scaling
+# that, each sprite is scaled once to its on-screen size and only sprites that
+# overlap the viewport are drawn at all.
+
+import pygame
+
+from compositor import FadeBuffer
+from mipmap import MipChain
+
+
+class Camera:
+    def __init__(self, viewport_size, center=None, zoom=1.0):
+        self.width, self.height = viewport_size
+        self.viewport = pygame.Rect(0, 0, self.width, self.height)
+        self.center = center if center is not None else (self.width / 2, self.height / 2)
+        self.zoom = zoom
+        self._fade = FadeBuffer()
+
+    def world_to_screen(self, pos):
+        return (
+            (pos[0] - self.center[0]) * self.zoom + self.width / 2,
+            (pos[1] - self.center[1]) * self.zoom + self.height / 2,
+        )
+
+    def screen_rect(self, world_center, world_size):
+        # Screen-space rect of a sprite of world_size (w, h) centred on world_center
+        x, y = self.world_to_screen(world_center)
+        w = max(1, int(world_size[0] * self.zoom))
+        h = max(1, int(world_size[1] * self.zoom))
+        return pygame.Rect(int(x - w / 2), int(y - h / 2), w, h)
+
+    def draw(self, target, image, world_center, world_size=None, smooth=None, alpha=255):
+        # image is a Surface or a MipChain. smooth: smoothscale rather than
+        # scale, by default only MipChains are. Returns the rect drawn to, or
+        # None if the sprite is off screen
+        if world_size is None:
+            world_size = image.get_size()
+        rect = self.screen_rect(world_center, world_size)
+        if not self.viewport.colliderect(rect):
+            return None
+        if isinstance(image, MipChain):
+            # Cached sizes are quantized, keep the sprite centred where it belongs
+            sprite = image.sample(rect.size, smooth is not False)
+            rect = sprite.get_rect(center=rect.center)
+        elif rect.size == image.get_size():
+            sprite = image
+        elif smooth:
+            sprite = pygame.transform.smoothscale(image, rect.size)
+        else:
+            sprite = pygame.transform.scale(image, rect.size)
+        if alpha >= 255:
+            return target.blit(sprite, rect)
+        # Sprites may be shared mip levels, fade a copy
+        return self._fade.blit(target, sprite, rect, alpha)
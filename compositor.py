@@ -0,0 +1,115 @@
+# ordered layer compositor
+#
+# Sprites are queued per layer and drawn straight onto the display surface in
+# layer order, instead of going through a new screen-sized SRCALPHA surface
+# every frame. A group fade (render with alpha < 255) goes through one
+# persistent scratch buffer, of which only the touched area is cleared and
+# copied. A faded sprite goes through a FadeBuffer, queued images are often
+# shared and are never written to.
+
+import pygame
+
+LAYER_BACKGROUND_EARTH = 0
+LAYER_SUN = 1
+LAYER_GLOW = 2
+LAYER_FOREGROUND_EARTH = 3
+LAYER_HUD = 4
+NUM_LAYERS = 5
+
+LAYER_NAMES = ('background earth', 'sun', 'glow', 'foreground earth', 'hud')
+
+
+class FadeBuffer:
+    # Blits an image at a surface alpha without calling set_alpha on it.
+    # Images passed around here are shared (mip levels, cached blends and
+    # samples, sun frames) and loader threads read some of them, so the fade
+    # is applied to a copy in a scratch surface that is reused between blits
+    # and only grows.
+    def __init__(self):
+        self._scratch = {}  # per-pixel alpha or not -> scratch surface
+
+    def blit(self, target, image, pos, alpha, special_flags=0):
+        per_pixel = bool(image.get_flags() & pygame.SRCALPHA)
+        width, height = image.get_size()
+        scratch = self._scratch.get(per_pixel)
+        if scratch is None or scratch.get_width() < width or scratch.get_height() < height:
+            size = (width, height) if scratch is None else \
+                (max(width, scratch.get_width()), max(height, scratch.get_height()))
+            scratch = pygame.Surface(size, pygame.SRCALPHA if per_pixel else 0)
+            self._scratch[per_pixel] = scratch
+        area = pygame.Rect(0, 0, width, height)
+        if per_pixel:
+            # Max onto transparent black copies the pixels, alpha included
+            scratch.fill((0, 0, 0, 0), area)
+            scratch.blit(image, (0, 0), None, pygame.BLEND_RGBA_MAX)
+        else:
+            colorkey = image.get_colorkey()
+            scratch.set_colorkey(colorkey)
+            if colorkey is not None:
+                scratch.fill(colorkey, area)
+            scratch.blit(image, (0, 0))
+        scratch.set_alpha(max(0, alpha))
+        return target.blit(scratch, pos, area, special_flags)
+
+
+class Compositor:
+    def __init__(self, screen):
+        self.screen = screen
+        self._layers = [[] for _ in range(NUM_LAYERS)]
+        self._scratch = None
+        self._scratch_used = None
+        self._fade = FadeBuffer()
+        self.profiler = None  # a FrameProfiler to lap after each layer drawn
+
+    def add(self, layer, image, pos, special_flags=0, alpha=255):
+        # pos is a top-left position or a Rect
+        self._layers[layer].append((image, pos, special_flags, alpha))
+
+    def clear(self):
+        for items in self._layers:
+            items.clear()
+
+    def _draw_layers(self, target):
+        rects = []
+        for layer, items in enumerate(self._layers):
+            if not items:
+                continue
+            batch = []
+            for image, pos, special_flags, alpha in items:
+                if alpha >= 255:
+                    batch.append((image, pos, None, special_flags))
+                    continue
+                if batch:
+                    rects.extend(target.blits(batch))
+                    batch = []
+                rects.append(self._fade.blit(target, image, pos, alpha, special_flags))
+            if batch:
+                rects.extend(target.blits(batch))
+            items.clear()
+            if self.profiler is not None:
+                self.profiler.lap(LAYER_NAMES[layer])
+        return rects
+
+    def _scratch_buffer(self):
+        size = self.screen.get_size()
+        if self._scratch is None or self._scratch.get_size() != size:
+            self._scratch = pygame.Surface(size, pygame.SRCALPHA)
+            self._scratch_used = None
+        return self._scratch
+
+    def render(self, alpha=255):
+        # Draws every queued layer and returns the rects touched on screen
+        if alpha >= 255:
+            return self._draw_layers(self.screen)
+
+        scratch = self._scratch_buffer()
+        if self._scratch_used:
+            scratch.fill((0, 0, 0, 0), self._scratch_used)
+        rects = [r for r in self._draw_layers(scratch) if r]
+        if not rects:
+            self._scratch_used = None
+            return []
+        used = rects[0].unionall(rects[1:])
+        self._scratch_used = used
+        scratch.set_alpha(max(0, alpha))
+        return [self.screen.blit(scratch, used.topleft, used)]
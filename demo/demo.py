@@ -4,11 +4,25 @@ import random
 import serial
 import time
 import sys
+import os
+
+# record / replay live in the repo root, next to the game, and are only
+# imported when asked for: they need numpy, which the demo doesn't otherwise
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 
 # --- TEST MODE ---
 TEST_MODE = '--test' in sys.argv
 
+def arg_value(flag):
+    # value following flag on the command line, e.g. --replay session.sunrec
+    if flag in sys.argv and sys.argv.index(flag) + 1 < len(sys.argv):
+        return sys.argv[sys.argv.index(flag) + 1]
+    return None
+
+RECORD_PATH = arg_value('--record')
+REPLAY_PATH = arg_value('--replay')
+
 # Initialize Pygame
 pygame.init()
 
@@ -39,14 +53,17 @@ clock = pygame.time.Clock()
 #     if arduino and arduino.is_open:
 #         arduino.write((command.strip() + '\n').encode('utf-8'))
 
-def read_arduino_sensor_data(arduino):
+def read_arduino_sensor_data(arduino, recorder=None):
     if arduino and arduino.in_waiting > 0:
         line = arduino.readline().decode('utf-8', errors='ignore').strip()
         if line:
             parts = line.split()
             if len(parts) == 7:
                 try:
-                    return [float(x) for x in parts]
+                    values = [float(x) for x in parts]
+                    if recorder:
+                        recorder.write(time.perf_counter(), values)
+                    return values
                 except ValueError:
                     print(f"Malformed float in line: {line}")
     return [float(0) for _ in range(7)]
@@ -364,15 +381,32 @@ def main():
 
     use_arduino_control = True  # Control flag for Arduino vs keyboard
 
-    try:
-        arduino = serial.Serial(port='COM3', baudrate=115200, timeout=1)
-        time.sleep(0.5)
-        arduino.reset_input_buffer()
-        arduino.reset_output_buffer()
-        print('Starting Arduino serial connection...')
-    except Exception as e:
-        print(f"Failed to connect to Arduino: {e}")
-        arduino = None
+    replay = None
+    if REPLAY_PATH:
+        from recording import SensorReplay
+        from sensors import SensorBuffer
+        replay_buffer = SensorBuffer(7)
+        replay = SensorReplay(REPLAY_PATH, replay_buffer)
+    recorder = None
+    if RECORD_PATH:
+        from recording import SessionRecorder
+        recorder = SessionRecorder(RECORD_PATH, 7)
+    if recorder:
+        recorder.resume(time.perf_counter())
+
+    arduino = None
+    if replay:
+        replay.resume(time.perf_counter())
+    else:
+        try:
+            arduino = serial.Serial(port='COM3', baudrate=115200, timeout=1)
+            time.sleep(0.5)
+            arduino.reset_input_buffer()
+            arduino.reset_output_buffer()
+            print('Starting Arduino serial connection...')
+        except Exception as e:
+            print(f"Failed to connect to Arduino: {e}")
+            arduino = None
 
     while running:
         for event in pygame.event.get():
@@ -390,7 +424,11 @@ def main():
 
         if not game_over:
             if use_arduino_control:
-                sensor_data = read_arduino_sensor_data(arduino)
+                if replay:
+                    replay.update(time.perf_counter())
+                    sensor_data = replay_buffer.frame_values()
+                else:
+                    sensor_data = read_arduino_sensor_data(arduino, recorder)
                 if sensor_data:
                     ax, ay, *_ = sensor_data
                     print(f"Sensor movement ax: {ax}, ay: {ay}")
@@ -429,10 +467,13 @@ def main():
             screen.blit(text, text_rect)
 
         pygame.display.flip()
-        arduino.reset_input_buffer()
-        arduino.reset_output_buffer()
+        if arduino:
+            arduino.reset_input_buffer()
+            arduino.reset_output_buffer()
         clock.tick(FPS)
 
+    if recorder:
+        recorder.close()
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+# optional dirty-rectangle presentation
+#
+# Layers report the rects they drew each frame. Only the union of this frame's
+# and last frame's rects is cleared and pushed to the display, which saves a
+# lot of memory bandwidth when just the sun, the Earth and the HUD change.
+# When disabled (the default) it is just fill + flip.
+
+import pygame
+
+
+class DirtyRects:
+    def __init__(self, screen, enabled=False, full_threshold=0.5, background=(0, 0, 0)):
+        self.screen = screen
+        self.enabled = enabled
+        self.full_threshold = full_threshold  # fraction of the screen that triggers a full flip
+        self.background = background
+        self.screen_area = screen.get_width() * screen.get_height()
+        self._previous = []
+        self._current = []
+        self._full = True
+
+    def invalidate(self):
+        # Next frame is cleared and presented in full, e.g. after a state change
+        self._full = True
+
+    def clear(self):
+        # Call at the start of a frame, before drawing
+        if not self.enabled or self._full:
+            self.screen.fill(self.background)
+        else:
+            for rect in self._previous:
+                self.screen.fill(self.background, rect)
+
+    def add(self, rect):
+        if rect:
+            clipped = pygame.Rect(rect).clip(self.screen.get_rect())
+            if clipped:
+                self._current.append(clipped)
+        return rect
+
+    def add_all(self, rects):
+        for rect in rects:
+            self.add(rect)
+
+    def present(self):
+        if not self.enabled:
+            pygame.display.flip()
+            self._current = []
+            return
+        rects = self._previous + self._current
+        if self._full or sum(r.w * r.h for r in rects) > self.full_threshold * self.screen_area:
+            pygame.display.flip()
+        elif rects:
+            pygame.display.update(rects)
+        self._previous = self._current
+        self._current = []
+        self._full = False
@@ -0,0 +1,280 @@
+# fake sun controller on a pseudo-terminal, for running without the ESP32
+#
+#   python emulator.py [--rate 60] [--protocol text|binary]
+#   python sun-game.py --port /dev/pts/N [--protocol binary]
+#
+# Prints the device path to connect to, then streams a gently wobbling,
+# steadily spinning sun the way sun-control-bt.ino does. Understands the
+# firmware's vibrate/flare/ping/reset and binary/text commands. POSIX only.
+#
+# Load testing the host's input path:
+#
+#   python emulator.py --measure --rate 600 --burst 8 --noise 40 --malformed 0.02
+#
+# runs the emulator and a SerialSensorReader against each other for a while
+# and reports parse throughput, latency and where samples were lost.
+
+import argparse
+import math
+import os
+import pty
+import random
+import select
+import threading
+import time
+import tty
+
+from protocol import encode_frame
+
+SPIN = 2000  # raw gz for a stable spin, what the game treats as on target
+WOBBLE = 150  # raw gx/gy amplitude
+REST_ACCEL = (1100, -500, 18200)  # raw accel at rest, as in vibration_feedback()
+LINK_BUFFER = 4096  # bytes queued before new samples are dropped, like the BT stack
+FLARE_DURATION = 1.0  # seconds, as in flare()
+
+
+class DeviceEmulator:
+    def __init__(self, rate=60, protocol='text', columns=3, burst=1, jitter=0.0, noise=0.0,
+                 malformed=0.0, seed=None):
+        self.rate = rate
+        self.binary = protocol == 'binary'
+        self.columns = columns  # 3: "gx gy gz" like sun-control-bt, 7: "ax ay az gx gy gz heat"
+        self.burst = max(1, burst)  # samples sent back to back, like Bluetooth batching
+        self.jitter = jitter  # random timing error, as a fraction of the send interval
+        self.noise = noise  # std dev of gaussian noise on every raw value
+        self.malformed = malformed  # probability a sample goes out torn or garbled
+        self.random = random.Random(seed)
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)  # no echo or newline translation, binary frames go through untouched
+        os.set_blocking(self.master, False)
+        self.slave = slave
+        self.path = os.ttyname(slave)
+        self.seq = 0
+        self.vibration = 0
+        self.flare_until = 0.0
+        self.start = time.monotonic()
+        self._command = bytearray()
+        self._outgoing = bytearray()
+        self._stop = threading.Event()
+        # counters for --measure
+        self.sent = 0
+        self.sent_times = []  # generation time of every well-formed sample, in order
+        self.dropped = 0
+        self.injected = 0
+
+    def sample(self, t):
+        gx = WOBBLE * math.sin(t * 0.7)
+        gy = WOBBLE * math.cos(t * 0.5)
+        gz = SPIN
+        ax, ay, az = REST_ACCEL
+        if t < self.flare_until or self.vibration:
+            # The motor shakes the accelerometer
+            shake = 2000 * max(self.vibration / 5, 1.0 if t < self.flare_until else 0.0)
+            ax += shake * math.sin(t * 190)
+            ay += shake * math.cos(t * 170)
+        heat = 30 + 10 * math.sin(t / 20)
+        values = [ax, ay, az, gx, gy, gz, heat]
+        if self.noise:
+            values = [v + self.random.gauss(0, self.noise) for v in values[:6]] + [values[6]]
+        return values
+
+    def encode(self, t, values):
+        ax, ay, az, gx, gy, gz, heat = values
+        if self.binary:
+            data = encode_frame(self.seq, t * 1000, ax, ay, az, gx, gy, gz, heat)
+        elif self.columns == 7:
+            data = f"{int(ax)} {int(ay)} {int(az)} {int(gx)} {int(gy)} {int(gz)} {heat:.2f}\r\n".encode()
+        else:
+            data = f"{int(gx)} {int(gy)} {int(gz)} \r\n".encode()
+        self.seq += 1
+        return data
+
+    def corrupt(self, data):
+        # Never parses as a valid sample: torn, garbled or the wrong shape
+        if self.binary:
+            data = bytearray(data)
+            data[self.random.randrange(2, len(data))] ^= 0xFF
+            return bytes(data)
+        kind = self.random.randrange(3)
+        if kind == 0:
+            return data[:self.random.randrange(1, max(2, len(data) // 3))].rstrip() + b"\r\n"  # torn
+        if kind == 1:
+            return bytes(self.random.choice(b"abcdefxyz#") for _ in range(12)) + b"\r\n"  # noise on the link
+        return b" ".join(data.split()[:-1] + [b"nan?"]) + b"\r\n"  # bad number
+
+    def send_sample(self, now):
+        t = now - self.start
+        data = self.encode(t, self.sample(t))
+        if self.malformed and self.random.random() < self.malformed:
+            self.queue(self.corrupt(data))
+            self.injected += 1
+        elif self.queue(data):
+            self.sent += 1
+            self.sent_times.append(now)
+        else:
+            self.dropped += 1
+
+    def queue(self, data):
+        # Like the Bluetooth link, drop what the host isn't reading instead of blocking
+        if len(self._outgoing) + len(data) > LINK_BUFFER:
+            return False
+        self._outgoing += data
+        return True
+
+    def flush(self):
+        if not self._outgoing:
+            return
+        try:
+            written = os.write(self.master, self._outgoing)
+        except BlockingIOError:
+            return
+        del self._outgoing[:written]
+
+    def reply(self, text):
+        self.queue((text + "\r\n").encode())
+
+    def handle_command(self, command):
+        if command.startswith("vibrate"):
+            try:
+                level = int(command[7:].strip() or 0)
+            except ValueError:
+                level = 0
+            self.vibration = max(0, min(5, level))
+            self.reply(f"vibrate level: {level}")
+        elif command == "flare":
+            self.flare_until = time.monotonic() - self.start + FLARE_DURATION
+        elif command == "reset":
+            pass
+        elif command == "ping":
+            self.reply("pong")
+        elif command == "binary":
+            if not self.binary:
+                self.seq = 0
+            self.binary = True
+        elif command == "text":
+            self.binary = False
+        elif command:
+            self.reply(f"Unknown command: {command}")
+
+    def poll_commands(self, timeout):
+        wanted = [self.master] if self._outgoing else []
+        readable, writable, _ = select.select([self.master], wanted, [], timeout)
+        if writable:
+            self.flush()
+        if not readable:
+            return
+        try:
+            data = os.read(self.master, 1024)
+        except (BlockingIOError, OSError):
+            return
+        for byte in data:
+            if byte == ord('\n'):
+                self.handle_command(self._command.decode('utf-8', errors='ignore').strip())
+                self._command.clear()
+            else:
+                self._command.append(byte)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        interval = self.burst / self.rate
+        next_send = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_send:
+                for _ in range(self.burst):
+                    self.send_sample(now)
+                self.flush()
+                next_send += interval * (1 + self.random.uniform(-self.jitter, self.jitter))
+                if now - next_send > 1:
+                    next_send = now  # fell far behind, don't burst to catch up
+            self.poll_commands(max(0, min(0.05, next_send - time.monotonic())))
+
+
+def measure(device, protocol, duration, frame_rate=60):
+    # Host side of the load test: the game's own reader, drained once per
+    # frame the way the game loop does
+    import serial
+    from benchmark import summarize
+    from sensors import SensorBuffer, SerialSensorReader
+
+    received_times = []
+
+    class TimedBuffer(SensorBuffer):
+        def push(self, timestamp, values):
+            received_times.append(time.monotonic())
+            SensorBuffer.push(self, timestamp, values)
+
+    port = serial.Serial(device.path, baudrate=115200, timeout=0.1)
+    buffer = TimedBuffer(device.columns)
+    reader = SerialSensorReader(port, device.columns, buffer, protocol=protocol).start()
+    emulator = threading.Thread(target=device.run, daemon=True)
+    emulator.start()
+
+    consumed = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        consumed += len(buffer.since_last())
+        time.sleep(1 / frame_rate)
+    device.stop()
+    emulator.join()
+    time.sleep(0.2)  # let the reader catch up with what is already in the pty
+    consumed += len(buffer.since_last())
+    reader.stop()
+    port.close()
+
+    # Well-formed samples arrive in order, so the nth received is the nth sent
+    latencies = [(r - s) * 1000 for s, r in zip(device.sent_times, received_times)]
+    report = {
+        'protocol': protocol,
+        'rate_hz': device.rate,
+        'duration_s': duration,
+        'sent': device.sent,
+        'dropped_on_device': device.dropped,
+        'malformed_injected': device.injected,
+        'received': len(received_times),
+        'received_per_s': round(len(received_times) / duration, 1),
+        'consumed_by_frames': consumed,
+        'buffer_overruns': buffer.overruns,
+        'reader_malformed': reader.malformed,
+        'latency_ms': summarize(latencies),
+    }
+    if reader.decoder is not None:
+        report['decoder'] = reader.decoder.stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sun controller emulator")
+    parser.add_argument('--rate', type=float, default=60, help='Samples per second')
+    parser.add_argument('--protocol', choices=('text', 'binary'), default='text',
+                        help='Start in this mode, the host can still switch it')
+    parser.add_argument('--columns', type=int, choices=(3, 7), default=3,
+                        help='Text columns: 3 for sun-control-bt (gx gy gz), 7 for the demo (ax ay az gx gy gz heat)')
+    parser.add_argument('--burst', type=int, default=1, help='Samples sent back to back per send')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Send timing jitter, as a fraction of the interval')
+    parser.add_argument('--noise', type=float, default=0.0, help='Std dev of noise added to raw IMU values')
+    parser.add_argument('--malformed', type=float, default=0.0, help='Probability a sample goes out corrupted')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed, for repeatable runs')
+    parser.add_argument('--measure', action='store_true',
+                        help='Read the stream back with the game\'s sensor reader and report throughput and latency')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run with --measure')
+    args = parser.parse_args()
+
+    device = DeviceEmulator(rate=args.rate, protocol=args.protocol, columns=args.columns, burst=args.burst,
+                            jitter=args.jitter, noise=args.noise, malformed=args.malformed, seed=args.seed)
+    if args.measure:
+        import json
+        print(json.dumps(measure(device, args.protocol, args.duration), indent=2))
+        return
+
+    print(f"Emulating the sun controller on {device.path}")
+    try:
+        device.run()
+    except KeyboardInterrupt:
+        print(f"Sent {device.sent} samples, dropped {device.dropped}, corrupted {device.injected}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,139 +2,269 @@ import pygame
 import math
 import random
 
-class Particle:
-    def __init__(self, x, y, angle, speed, color, size):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.speed = speed
-        self.color = color
-        self.size = size
-        self.life = 1.0  # Life from 1 to 0
-        self.decay_rate = 0.02  # How fast particle fades
-        self.dx = math.cos(angle) * speed
-        self.dy = math.sin(angle) * speed
+import numpy as np
+
+from sprites import ANGLE_STEP, SIZE_STEP, ParticleSprites
+
+
+class ParticleStore:
+    # Struct-of-arrays particle storage: one numpy array per attribute, live
+    # particles packed at the front. update() moves, fades and culls every
+    # particle at once and compacts the survivors, so the cost per frame
+    # barely depends on the particle count.
+    FLOAT_FIELDS = ('x', 'y', 'dx', 'dy', 'life', 'decay', 'size', 'shrink', 'rotation', 'rotation_speed')
+
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.capacity = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        def resized(old, shape, dtype):
+            new = np.zeros(shape, dtype)
+            if old is not None:
+                new[:self.count] = old[:self.count]
+            return new
+        for name in self.FLOAT_FIELDS:
+            setattr(self, name, resized(getattr(self, name, None), capacity, np.float64))
+        self.sprite = resized(getattr(self, 'sprite', None), capacity, np.int32)  # image piece, -1 for a plain circle
+        self.color = resized(getattr(self, 'color', None), (capacity, 3), np.uint8)
+        self.capacity = capacity
+
+    def add(self, x, y, angle, speed, size, color=(255, 255, 255), sprite=-1, rotation_speed=0.0,
+            decay=0.02, shrink=0.5):
+        # Same parameters as a single particle used to take; arrays work too
+        x, y, angle, speed, size = np.broadcast_arrays(*(np.asarray(v, np.float64) for v in (x, y, angle, speed, size)))
+        n = x.size
+        if self.count + n > self.capacity:
+            self._grow(max(self.capacity * 2, self.count + n))
+        s = slice(self.count, self.count + n)
+        self.x[s] = x.ravel()
+        self.y[s] = y.ravel()
+        self.dx[s] = (np.cos(angle) * speed).ravel()
+        self.dy[s] = (np.sin(angle) * speed).ravel()
+        self.life[s] = 1.0  # Life from 1 to 0
+        self.decay[s] = decay  # How fast particle fades
+        self.size[s] = size.ravel()
+        self.shrink[s] = shrink
+        self.rotation[s] = 0
+        self.rotation_speed[s] = rotation_speed  # Degrees per frame
+        self.sprite[s] = sprite
+        self.color[s] = color
+        self.count += n
 
     def update(self):
-        self.x += self.dx
-        self.y += self.dy
-        self.life -= self.decay_rate
-        self.size = max(0, self.size - 0.5)
-        return self.life > 0
-
-    def draw(self, surface):
-        alpha = int(255 * self.life)
-        color_with_alpha = (*self.color, alpha)
-        particle_surface = pygame.Surface((int(self.size * 2), int(self.size * 2)), pygame.SRCALPHA)
-        pygame.draw.circle(particle_surface, color_with_alpha, 
-                         (int(self.size), int(self.size)), 
-                         int(self.size))
-        surface.blit(particle_surface, 
-                    (int(self.x - self.size), int(self.y - self.size)))
-
-class ImageParticle(Particle):
-    def __init__(self, x, y, angle, speed, image_piece, size):
-        super().__init__(x, y, angle, speed, (255, 255, 255), size)  # Color unused for image particles
-        self.image = image_piece
-        self.rotation = 0
-        self.rotation_speed = random.uniform(-5, 5)  # Degrees per frame
-        
-    def draw(self, surface):
-        if self.life <= 0:
-            return
-            
-        # Create circular mask
-        mask_size = int(self.size * 2)
-        mask = pygame.Surface((mask_size, mask_size), pygame.SRCALPHA)
-        
-        # Scale image to fit the mask
-        scaled_image = pygame.transform.scale(self.image, (mask_size, mask_size))
-        
-        # Create circular mask
-        pygame.draw.circle(mask, (255, 255, 255, int(255 * self.life)), 
-                         (mask_size//2, mask_size//2), mask_size//2)
-        
-        # Apply mask to image
-        scaled_image.blit(mask, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-        
-        # Rotate
-        self.rotation += self.rotation_speed
-        rotated = pygame.transform.rotate(scaled_image, self.rotation)
-        
-        # Calculate position accounting for rotation
-        pos_x = int(self.x - rotated.get_width() / 2)
-        pos_y = int(self.y - rotated.get_height() / 2)
-        surface.blit(rotated, (pos_x, pos_y))
+        n = self.count
+        self.x[:n] += self.dx[:n]
+        self.y[:n] += self.dy[:n]
+        self.life[:n] -= self.decay[:n]
+        np.maximum(self.size[:n] - self.shrink[:n], 0, out=self.size[:n])
+        self.rotation[:n] += self.rotation_speed[:n]
+
+        alive = self.life[:n] > 0
+        if not alive.all():
+            # Compact the survivors to the front, the tail is free for reuse
+            keep = np.flatnonzero(alive)
+            for name in self.FLOAT_FIELDS + ('sprite', 'color'):
+                array = getattr(self, name)
+                array[:keep.size] = array[keep]
+            self.count = keep.size
+        return self.count > 0
+
+    def copy(self):
+        store = ParticleStore(self.capacity)
+        for name in self.FLOAT_FIELDS + ('sprite', 'color'):
+            getattr(store, name)[:] = getattr(self, name)
+        store.count = self.count
+        return store
+
+    def __len__(self):
+        return self.count
+
 
 class ExplosionSystem:
-    def __init__(self, x, y, sun_frame=None):
-        self.particles = []
+    def __init__(self, x, y, sun_frame=None, num_sparks=50, sprites=None, rng=random, coarseness=1):
+        # sprites: a ParticleSprites already made from this sun frame's pieces
+        # rng: where the launch angles, speeds and colours come from
+        # coarseness: multiplies the sprite size and angle steps, see quality.py
+        self.particles = ParticleStore()
+        self.rng = rng
+        self.pieces = []
+        self.sprites = sprites
         self.x = x
         self.y = y
         self.is_active = True
         self.sun_frame = sun_frame
+        self.num_sparks = num_sparks
+        self.coarseness = coarseness
         self.create_explosion()
 
     def split_image_into_pieces(self, image, num_pieces_x, num_pieces_y):
         pieces = []
         piece_width = image.get_width() // num_pieces_x
         piece_height = image.get_height() // num_pieces_y
-        
+
         for y in range(num_pieces_y):
             for x in range(num_pieces_x):
                 # Create surface for this piece
                 piece = pygame.Surface((piece_width, piece_height), pygame.SRCALPHA)
                 # Copy the corresponding part of the image
-                piece.blit(image, (0, 0), 
+                piece.blit(image, (0, 0),
                           (x * piece_width, y * piece_height, piece_width, piece_height))
                 pieces.append(piece)
-        
+
         return pieces
 
     def create_explosion(self):
         # Create image-based particles if we have a sun frame
         if self.sun_frame:
             # Split the sun frame into pieces
-            pieces = self.split_image_into_pieces(self.sun_frame, 8, 8)  # 64 pieces
+            if self.sprites is None:
+                self.sprites = self.make_sprites(self.split_image_into_pieces(self.sun_frame, 8, 8))  # 64 pieces
+            self.pieces = self.sprites.pieces
             piece_size = self.sun_frame.get_width() // 16  # Make pieces smaller for better circle effect
-            
-            for i, piece in enumerate(pieces):
+
+            for i in range(len(self.pieces)):
                 # Calculate position relative to center
                 grid_x = (i % 8) - 4  # -4 to 3
                 grid_y = (i // 8) - 4  # -4 to 3
-                
+
                 # Calculate angle based on position
                 angle = math.atan2(grid_y, grid_x)
                 # Add some randomness to the angle
-                angle += random.uniform(-0.2, 0.2)
-                
+                angle += self.rng.uniform(-0.2, 0.2)
+
                 # Speed based on distance from center
                 distance = math.sqrt(grid_x**2 + grid_y**2)
-                speed = random.uniform(5, 15) * (distance / 5.6)  # 5.6 is max distance from center
-                
-                # Create particle with image piece
-                self.particles.append(ImageParticle(
+                speed = self.rng.uniform(5, 15) * (distance / 5.6)  # 5.6 is max distance from center
+
+                # Particle drawn with this image piece
+                self.particles.add(
                     self.x + grid_x * 20,  # Spread out initial positions
                     self.y + grid_y * 20,
                     angle,
                     speed,
-                    piece,
-                    piece_size
-                ))
-        
+                    piece_size,
+                    sprite=i,
+                    rotation_speed=self.rng.uniform(-5, 5),
+                )
+
+        if self.sprites is None:
+            self.sprites = self.make_sprites()
+
         # Add some regular particles for additional effect
-        num_particles = 50
+        num_particles = self.num_sparks
         for i in range(num_particles):
             angle = (i / num_particles) * (2 * math.pi)
-            speed = random.uniform(5, 15)
-            color = (255, random.randint(100, 200), 0)  # Orange-yellow variations
-            size = random.uniform(10, 30)
-            self.particles.append(Particle(self.x, self.y, angle, speed, color, size))
+            speed = self.rng.uniform(5, 15)
+            color = (255, self.rng.randint(100, 200), 0)  # Orange-yellow variations
+            size = self.rng.uniform(10, 30)
+            self.particles.add(self.x, self.y, angle, speed, size, color=color)
+
+    def make_sprites(self, pieces=()):
+        return ParticleSprites(pieces, SIZE_STEP * self.coarseness, ANGLE_STEP * self.coarseness)
+
+    def place(self, x, y):
+        # Move an explosion that hasn't started yet, see prepare_explosion()
+        n = self.particles.count
+        self.particles.x[:n] += x - self.x
+        self.particles.y[:n] += y - self.y
+        self.x = x
+        self.y = y
+
+    def warm(self):
+        # Runs the explosion on a copy of the particles and renders every
+        # sprite it will draw, so none are built while it is on screen
+        particles = self.particles.copy()
+        self.sprite_batch(particles)
+        while particles.update():
+            self.sprite_batch(particles)
+
+    def update(self, steps=1):
+        # Advances the particles by this many simulation ticks. Returns true
+        # as long as there are active particles.
+        for _ in range(steps):
+            self.particles.update()
+        return self.particles.count > 0
+
+    def draw(self, surface, alpha=1.0):
+        # Every particle is a cached sprite, drawn in one blits() call.
+        # alpha: how far past the last tick, see timestep.py. Returns the
+        # rects touched, for dirty-rect rendering
+        return surface.blits(self.sprite_batch(self.particles, alpha))
+
+    def sprite_batch(self, p, tick_alpha=1.0):
+        # (sprite, position) for every live particle in p, tick_alpha of the
+        # way from its previous position to its current one
+        n = p.count
+        xs = p.x[:n] - p.dx[:n] * (1 - tick_alpha)
+        ys = p.y[:n] - p.dy[:n] * (1 - tick_alpha)
+        sprites = self.sprites
+        mask_size = (p.size[:n] * 2).astype(np.int32)
+        diameter, radius, alpha, color = sprites.circle_buckets(p.size[:n], p.life[:n], p.color[:n])
+        piece_size, angle, fade = sprites.piece_buckets(mask_size, p.rotation[:n], p.life[:n])
+        batch = []
+        for x, y, sprite, size, rot, fade_alpha, d, r, a, c in zip(
+                xs.tolist(), ys.tolist(), p.sprite[:n].tolist(),
+                piece_size.tolist(), angle.tolist(), fade.tolist(),
+                diameter.tolist(), radius.tolist(), alpha.tolist(), map(tuple, color.tolist())):
+            if sprite >= 0:
+                if d < 1:
+                    continue
+                image = sprites.piece(sprite, size, rot, fade_alpha)
+                batch.append((image, (int(x - image.get_width() / 2), int(y - image.get_height() / 2))))
+            else:
+                batch.append((sprites.circle(d, r, a, c), (int(x - r), int(y - r))))
+        return batch
+
+
+class BakedExplosion:
+    # An ExplosionSystem played back from draw lists recorded ahead of time:
+    # for every frame, the sprites and where they go relative to the centre.
+    # Same interface as ExplosionSystem, but nothing is simulated or looked
+    # up while it plays, each frame is one blits() call. Frame n is the
+    # explosion after n ticks.
+    def __init__(self, explosion):
+        self.frames = []
+        particles = explosion.particles.copy()
+        alive = particles.count > 0
+        while alive:
+            self.frames.append([(image, (x - int(explosion.x), y - int(explosion.y)))
+                                for image, (x, y) in explosion.sprite_batch(particles)])
+            alive = particles.update()
+        self.x = explosion.x
+        self.y = explosion.y
+        self.frame = 0
+        self.is_active = True
+
+    def place(self, x, y):
+        self.x = x
+        self.y = y
+
+    def update(self, steps=1):
+        self.frame += steps
+        return self.frame < len(self.frames)
+
+    def draw(self, surface, alpha=1.0):
+        # Frames are only recorded at ticks, alpha is ignored
+        ox, oy = int(self.x), int(self.y)
+        return surface.blits([(image, (x + ox, y + oy)) for image, (x, y) in self.frames[self.frame]])
+
+
+EXPLOSION_MODES = ('live', 'baked')
 
-    def update(self):
-        self.particles = [p for p in self.particles if p.update()]
-        return bool(self.particles)  # Return true as long as there are active particles
 
-    def draw(self, surface):
-        for particle in self.particles:
-            particle.draw(surface) 
\ No newline at end of file
+def prepare_explosion(sun_frame, seed, num_sparks=50, mode='live', coarseness=1):
+    # Everything starting an explosion at game over used to do (cutting the
+    # sun frame into pieces, launching the particles, rendering their
+    # sprites), done ahead of time. Safe to run on a loader thread; seed
+    # keeps the result the same wherever and whenever it runs. Call
+    # place() before the first update(). num_sparks and coarseness come
+    # from the quality level, see quality.py.
+    #   live   simulates the particles as it plays
+    #   baked  plays back recorded draw lists, a fixed cost per frame
+    explosion = ExplosionSystem(0, 0, sun_frame, num_sparks, rng=random.Random(seed), coarseness=coarseness)
+    if mode == 'baked':
+        return BakedExplosion(explosion)
+    explosion.warm()
+    return explosion
@@ -0,0 +1,223 @@
+# sensor smoothing
+#
+# Every sample that arrived since the last frame goes through the filter as
+# one block: update_block(xs, dts) takes numpy arrays of the samples and of
+# the time since the previous sample, and returns the filtered value after
+# the last one. dts come from the sample timestamps (SampleTimer.steps), and
+# the windows are sized in seconds, so a filter smooths over the same time
+# whether the sensor sends 60 or 200+ samples per second, and so does the
+# drift integration.
+#
+#   average    running-sum moving average over the last `window` seconds
+#   ema        exponential moving average with a time constant, closed form
+#              over the block
+#   one-euro   adaptive low-pass: smooth when still, responsive when moving;
+#              its cutoff depends on the previous step, so it steps through
+#              the block sample by sample
+#   median     median of the last `window` seconds, rejects single-sample
+#              spikes
+#
+# update(x, dt) is the same for a single sample.
+
+import math
+from collections import deque
+
+import numpy as np
+
+NOMINAL_DT = 1 / 60  # what a sample is worth when there is nothing before it
+MAX_DT = 0.1  # a gap in the stream counts as at most this long
+
+
+class TimeWindow:
+    # The samples of the last `window` seconds, oldest first, on a local
+    # clock that advances by each sample's dt. The newest sample is always
+    # kept, however long ago it came in.
+    def __init__(self, window):
+        self.window = window
+        self.reset()
+
+    def reset(self, value=None, settled=False):
+        # settled: as if the input had been sitting at value for the whole
+        # window, one sample per NOMINAL_DT
+        self.times = deque()
+        self.values = deque()
+        self.now = 0.0
+        if value is not None:
+            count = max(1, round(self.window / NOMINAL_DT)) if settled else 1
+            for i in range(count):
+                self.times.append((i + 1 - count) * NOMINAL_DT)
+                self.values.append(value)
+
+    def extend(self, xs, dts):
+        # Returns the values that dropped out of the window
+        times = self.now + np.cumsum(dts)
+        self.now = float(times[-1])
+        self.times.extend(times.tolist())
+        self.values.extend(xs.tolist())
+        dropped = []
+        cutoff = self.now - self.window
+        while len(self.times) > 1 and self.times[0] <= cutoff:
+            self.times.popleft()
+            dropped.append(self.values.popleft())
+        return dropped
+
+
+class MovingAverage:
+    def __init__(self, window=10 * NOMINAL_DT):
+        self._window = TimeWindow(window)
+        self.reset()
+
+    def reset(self, value=None, settled=False):
+        self._window.reset(value, settled)
+        self._sum = math.fsum(self._window.values)
+        self.value = value
+
+    def update_block(self, xs, dts):
+        self._sum += float(xs.sum())
+        self._sum -= math.fsum(self._window.extend(xs, dts))
+        self.value = self._sum / len(self._window.values)
+        return self.value
+
+    def update(self, x, dt):
+        return self.update_block(np.array([x], float), np.array([dt], float))
+
+
+class ExponentialAverage:
+    def __init__(self, time_constant=0.08):
+        self.time_constant = time_constant
+        self.reset()
+
+    def reset(self, value=None, settled=False):
+        self.value = value
+
+    def update_block(self, xs, dts):
+        # Same as stepping value += (1 - exp(-dt / tc)) * (x - value) per
+        # sample: each sample's weight decays with the time after it
+        if self.value is None:
+            self.value = float(xs[0])
+            xs, dts = xs[1:], dts[1:]
+            if not len(xs):
+                return self.value
+        after = np.cumsum(dts[::-1])[::-1] - dts  # time from each sample to the last
+        alpha = 1 - np.exp(-dts / self.time_constant)
+        weights = alpha * np.exp(-after / self.time_constant)
+        self.value = self.value * math.exp(-float(dts.sum()) / self.time_constant) + float(weights @ xs)
+        return self.value
+
+    def update(self, x, dt):
+        return self.update_block(np.array([x], float), np.array([dt], float))
+
+
+class OneEuroFilter:
+    # Casiez et al., "1 Euro Filter", CHI 2012
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self, value=None, settled=False):
+        self.value = value
+        self._derivative = 0.0
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1 / (2 * math.pi * cutoff)
+        return 1 / (1 + tau / dt)
+
+    def update_block(self, xs, dts):
+        for x, dt in zip(xs.tolist(), dts.tolist()):
+            self.update(x, dt)
+        return self.value
+
+    def update(self, x, dt):
+        if self.value is None:
+            self.value = x
+            return x
+        dt = max(dt, 1e-6)
+        derivative = (x - self.value) / dt
+        self._derivative += self._alpha(self.d_cutoff, dt) * (derivative - self._derivative)
+        cutoff = self.min_cutoff + self.beta * abs(self._derivative)
+        self.value += self._alpha(cutoff, dt) * (x - self.value)
+        return self.value
+
+
+class MedianFilter:
+    def __init__(self, window=5 * NOMINAL_DT):
+        self._window = TimeWindow(window)
+        self.reset()
+
+    def reset(self, value=None, settled=False):
+        self._window.reset(value, settled)
+        self.value = value
+
+    def update_block(self, xs, dts):
+        # The window is a few dozen samples at most
+        self._window.extend(xs, dts)
+        ordered = sorted(self._window.values)
+        self.value = ordered[len(ordered) // 2]
+        return self.value
+
+    def update(self, x, dt):
+        return self.update_block(np.array([x], float), np.array([dt], float))
+
+
+FILTERS = {
+    'average': MovingAverage,
+    'ema': ExponentialAverage,
+    'one-euro': OneEuroFilter,
+    'median': MedianFilter,
+}
+
+
+def make_filter(name, **kwargs):
+    return FILTERS[name](**kwargs)
+
+
+class SampleTimer:
+    # dt between consecutive sample timestamps
+    def __init__(self):
+        self.last = None
+
+    def reset(self):
+        self.last = None
+
+    def step(self, timestamp):
+        dt = NOMINAL_DT if self.last is None else timestamp - self.last
+        self.last = timestamp
+        return max(0.0, min(MAX_DT, dt))
+
+    def steps(self, timestamps):
+        # numpy array of timestamps -> the dt before each one
+        previous = timestamps[0] - NOMINAL_DT if self.last is None else self.last
+        self.last = float(timestamps[-1])
+        dts = np.empty_like(timestamps)
+        dts[0] = timestamps[0] - previous
+        np.subtract(timestamps[1:], timestamps[:-1], out=dts[1:])
+        return dts.clip(0.0, MAX_DT, out=dts)
+
+
+class DriftIntegrator:
+    # The game's drift used to be stepped once per frame:
+    #     drift += rate - drift / decay_frames
+    # This is the same thing per second of sample time, so it is identical
+    # with one sample per frame at frame_rate and doesn't speed up when
+    # samples come in faster.
+    def __init__(self, frame_rate=60, decay_frames=100):
+        self.frame_rate = frame_rate
+        self.decay_frames = decay_frames
+
+    def step(self, drift, rate, dt):
+        frames = dt * self.frame_rate
+        return drift + (rate - drift / self.decay_frames) * frames
+
+    def integrate(self, drift, rates, dts):
+        # step() over a block of samples at once. Each step scales drift by
+        # (1 - frames / decay_frames) and adds rate * frames, so the result
+        # is the start value and every sample's rate, each scaled by the
+        # steps after it. rates may have a column per axis, with drift a
+        # value per axis; the weights are worked out once for all of them.
+        frames = dts * self.frame_rate
+        keep = 1 - frames / self.decay_frames
+        kept = np.cumprod(keep[::-1])[::-1]  # product of keep from each sample on
+        return kept[0] * np.asarray(drift) + (frames * kept / keep) @ rates
@@ -0,0 +1,53 @@
+# cached sun glow overlays
+#
+# The brightness effect used to create a new sun-sized surface and draw a
+# circle into it on every frame. Brightness is an int in 0..max_level, so
+# every overlay is built once (when first needed) and just looked up after
+# that. Overlays are a soft radial falloff, cropped to the glow itself and
+# meant to be blitted with BLEND_RGB_ADD, where black adds nothing. The glow
+# is added straight onto the screen, so it has to fade out by the edge of
+# the sun's opaque disc: anything past it would show as a grey halo on the
+# black background.
+
+import pygame
+
+
+class GlowCache:
+    def __init__(self, radius=110, falloff=24, max_level=60):
+        self.radius = radius  # fades to nothing at this radius, the sun's disc
+        self.core_radius = radius - falloff  # full brightness inside this radius
+        self.max_level = max_level
+        self._overlays = [None] * (max_level + 1)
+
+    def overlay(self, level):
+        level = max(0, min(self.max_level, int(level)))
+        surface = self._overlays[level]
+        if surface is None:
+            surface = self._build(level)
+            self._overlays[level] = surface
+        return surface
+
+    def _build(self, level):
+        size = self.radius * 2
+        surface = pygame.Surface((size, size))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        surface.fill((0, 0, 0))
+        center = (self.radius, self.radius)
+        # Concentric discs from the outside in, each a bit brighter
+        for r in range(self.radius, self.core_radius, -1):
+            t = (self.radius - r) / (self.radius - self.core_radius)
+            value = int(level * t * t * (3 - 2 * t))  # smoothstep
+            if value > 0:
+                pygame.draw.circle(surface, (value, value, value), center, r)
+        pygame.draw.circle(surface, (level, level, level), center, self.core_radius)
+        return surface
+
+    def draw_position(self, center):
+        # Top-left blit position for an overlay centred on center
+        return (center[0] - self.radius, center[1] - self.radius)
+
+    def prepare(self):
+        # Builds every overlay, safe to run on a loader thread
+        for level in range(self.max_level + 1):
+            self.overlay(level)
@@ -0,0 +1,66 @@
+# mip chains for sprites drawn at many sizes
+#
+# Each level is half the size of the one above it (512, 256, 128, 64, ...).
+# A sample picks the smallest level that is still at least as big as the
+# requested size, so the final smoothscale never shrinks by more than 2x, and
+# results are cached per quantized size so repeated zooms are just lookups.
+
+import math
+from collections import OrderedDict
+
+import pygame
+
+STEPS_PER_OCTAVE = 24  # size buckets per doubling, ~3% apart
+
+
+class MipChain:
+    def __init__(self, image, min_size=16, cache_bytes=48 * 1024 * 1024):
+        self.levels = [image]
+        while min(self.levels[-1].get_size()) // 2 >= min_size:
+            level = self.levels[-1]
+            self.levels.append(pygame.transform.smoothscale(level, (level.get_width() // 2, level.get_height() // 2)))
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+
+    def level(self, size):
+        # Smallest level that is at least size wide, or the full-size image
+        for level in reversed(self.levels):
+            if level.get_width() >= size:
+                return level
+        return self.levels[0]
+
+    @staticmethod
+    def quantize(size):
+        if size <= 1:
+            return 1
+        step = round(math.log2(size) * STEPS_PER_OCTAVE)
+        return max(1, int(round(2 ** (step / STEPS_PER_OCTAVE))))
+
+    def sample(self, size, smooth=True):
+        # size is (w, h) or a single edge length; surfaces are shared, do not
+        # modify. smooth=False scales the level without filtering, cheaper
+        # and blockier.
+        if isinstance(size, (tuple, list)):
+            width, height = size
+        else:
+            width = height = size
+        target = (self.quantize(width), self.quantize(height))
+        key = target + (smooth,)
+        surface = self._cache.get(key)
+        if surface is not None:
+            self._cache.move_to_end(key)
+            return surface
+        level = self.level(target[0])
+        if level.get_size() == target:
+            return level
+        if smooth:
+            surface = pygame.transform.smoothscale(level, target)
+        else:
+            surface = pygame.transform.scale(level, target)
+        self._cache[key] = surface
+        self._cached_bytes += target[0] * target[1] * 4
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self._cached_bytes -= old.get_width() * old.get_height() * 4
+        return surface
@@ -0,0 +1,265 @@
+# per-frame profiling
+#
+#   python sun-game.py --trace session.json    (F3 toggles the overlay)
+#
+# The game loop calls begin_frame() at the top of every frame and lap(name)
+# at the end of each section: event pump, sensor read, simulation, every
+# compositor layer, text, present and the clock.tick wait. A lap is one
+# perf_counter_ns() call and an append, cheap enough to leave on all the
+# time. Frames are kept per game state for rolling statistics, shown on
+# screen by the overlay. With a trace path every section is also kept and
+# written at exit as Chrome trace JSON, for chrome://tracing or
+# https://ui.perfetto.dev.
+#
+# StateCapture goes deeper on one game state window, on a kiosk without a
+# debugger attached:
+#
+#   python sun-game.py --profile-state earth_intro    (or F4 at any time)
+#
+# runs cProfile from when the state begins until the next state starts, and
+# compares tracemalloc snapshots taken at either end.
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+import pygame
+
+from benchmark import summarize
+
+FRAME_BUDGET_MS = 1000 / 60
+WAIT_SECTION = 'tick'  # time spent waiting for the next frame, not working
+TRACE_LIMIT = 1_000_000  # sections kept for the trace, the oldest are dropped first
+
+OVERLAY_WIDTH = 300
+GRAPH_HEIGHT = 60
+GRAPH_SCALE_MS = 2 * FRAME_BUDGET_MS  # top of the graph
+OVERLAY_REFRESH = 15  # frames between overlay redraws
+
+
+class FrameProfiler:
+    def __init__(self, state_names, history=240, trace_path=None):
+        self.state_names = state_names
+        self.history = history  # frames kept per state for the rolling statistics
+        self.trace_path = trace_path
+        self.trace = deque(maxlen=TRACE_LIMIT) if trace_path else None
+        self.frames = {}  # state -> deque of (work ms, {section: ms})
+        self.section_totals = {}  # state -> {section: ms summed over its frames}
+        self.recent = deque(maxlen=OVERLAY_WIDTH - 16)  # work ms of the last frames, any state
+        self.show_overlay = False
+        self.state = None
+        self._origin = time.perf_counter_ns()
+        self._frame_start = None
+        self._last = None
+        self._laps = []  # (name, start ns, end ns) in this frame
+        self._overlay = None
+        self._overlay_age = 0
+        self._font = None
+
+    def begin_frame(self, state):
+        # Closes the previous frame and starts timing a new one
+        now = time.perf_counter_ns()
+        if self._frame_start is not None:
+            self._end_frame(now)
+        self.state = state
+        self._frame_start = now
+        self._last = now
+        self._laps = []
+
+    def lap(self, name):
+        # Ends a section: everything since the previous lap counts as name.
+        # A name used more than once in a frame adds up.
+        now = time.perf_counter_ns()
+        self._laps.append((name, self._last, now))
+        self._last = now
+
+    def _end_frame(self, now):
+        sections = {}
+        for name, start, end in self._laps:
+            sections[name] = sections.get(name, 0) + (end - start) / 1e6
+        if now > self._last:
+            sections['other'] = sections.get('other', 0) + (now - self._last) / 1e6
+        work = (now - self._frame_start) / 1e6 - sections.get(WAIT_SECTION, 0)
+        frames = self.frames.get(self.state)
+        if frames is None:
+            frames = self.frames[self.state] = deque(maxlen=self.history)
+        totals = self.section_totals.setdefault(self.state, {})
+        if len(frames) == frames.maxlen:
+            for name, ms in frames[0][1].items():
+                totals[name] -= ms
+        frames.append((work, sections))
+        for name, ms in sections.items():
+            totals[name] = totals.get(name, 0) + ms
+        self.recent.append(work)
+
+        if self.trace is not None:
+            # The frame itself is named after the state it ran in
+            self.trace.append((self.state_names.get(self.state, str(self.state)), self._frame_start, now))
+            self.trace.extend(self._laps)
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self._overlay = None
+
+    def draw_overlay(self, target, pos=(8, 8)):
+        # Returns the rect drawn, or None while the overlay is hidden. The
+        # overlay is re-rendered every few frames, in between it is one blit.
+        if not self.show_overlay:
+            return None
+        if self._overlay is None or self._overlay_age >= OVERLAY_REFRESH:
+            self._overlay = self._render_overlay()
+            self._overlay_age = 0
+        self._overlay_age += 1
+        return target.blit(self._overlay, pos)
+
+    def _render_overlay(self):
+        if self._font is None:
+            self._font = pygame.font.SysFont(None, 18)
+        frames = self.frames.get(self.state, ())
+        stats = summarize([work for work, _ in frames])
+        means = {name: total / len(frames) for name, total in self.section_totals.get(self.state, {}).items()}
+        lines = [f"{self.state_names.get(self.state, self.state)}  ({len(frames)} frames)",
+                 f"work ms  p50 {stats['p50']:.2f}  p95 {stats['p95']:.2f}  max {stats['max']:.2f}"]
+        lines += [f"  {name:<16}{ms:7.2f} ms" for name, ms in sorted(means.items(), key=lambda item: -item[1])
+                  if ms >= 0.005]  # sections that didn't run lately drop out
+
+        line_height = self._font.get_linesize()
+        overlay = pygame.Surface((OVERLAY_WIDTH, GRAPH_HEIGHT + 16 + line_height * len(lines)), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))
+
+        # Frame-time graph, one column per frame, red where the budget was blown
+        bottom = 8 + GRAPH_HEIGHT
+        if self.recent:
+            work = np.fromiter(self.recent, np.float64)
+            heights = np.minimum(GRAPH_HEIGHT, (work / GRAPH_SCALE_MS * GRAPH_HEIGHT).astype(np.int32))
+            filled = np.arange(GRAPH_HEIGHT)[::-1][None, :] < heights[:, None]  # (frame, row from the top)
+            colors = np.where((work > FRAME_BUDGET_MS)[:, None], (230, 60, 60), (80, 200, 80)).astype(np.uint8)
+            columns = np.where(filled[:, :, None], colors[:, None, :], np.uint8(0))
+            overlay.blit(pygame.surfarray.make_surface(columns), (8, 8))
+        budget_y = bottom - int(FRAME_BUDGET_MS / GRAPH_SCALE_MS * GRAPH_HEIGHT)
+        pygame.draw.line(overlay, (255, 255, 255), (8, budget_y), (OVERLAY_WIDTH - 8, budget_y))
+
+        y = bottom + 8
+        for line in lines:
+            overlay.blit(self._font.render(line, True, (255, 255, 255)), (8, y))
+            y += line_height
+        return overlay
+
+    def write_trace(self):
+        # Chrome trace format: complete ("X") events in microseconds, sections
+        # nest under their frame on the same thread
+        if self.trace is None:
+            return
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "game loop"}}]
+        for name, start, end in self.trace:
+            events.append({"name": name, "ph": "X", "pid": pid, "tid": 0,
+                           "ts": (start - self._origin) / 1000, "dur": (end - start) / 1000})
+        try:
+            with open(self.trace_path, 'w') as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        except OSError as e:
+            print(f"Could not write trace: {e}")
+            return
+        print(f"Wrote {len(events) - 1} trace events to {self.trace_path}")
+
+
+ALLOC_TRACE_DEPTH = 8  # frames kept per allocation when StateCapture starts tracemalloc
+ALLOC_TOP = 30  # allocation sites listed in the report
+
+
+class StateCapture:
+    def __init__(self, state_names, trigger=None, output_dir='.'):
+        self.state_names = state_names
+        self.trigger = trigger  # state whose first window is captured, or None
+        self.output_dir = output_dir
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Could not create profile directory: {e}")
+        self.state = None
+        self.frames = 0
+        self._profile = None
+        self._before = None
+        self._started_tracing = False
+        self._start_time = None
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def state_changed(self, state):
+        # Call when a new state begins: ends a running capture, and starts
+        # the triggered one
+        if self.active:
+            self.stop()
+        if state == self.trigger:
+            self.trigger = None
+            self.start(state)
+
+    def frame(self):
+        if self.active:
+            self.frames += 1
+
+    def start(self, state):
+        self.state = state
+        self.frames = 0
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(ALLOC_TRACE_DEPTH)
+        self._before = tracemalloc.take_snapshot()
+        self._start_time = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        print(f"Capturing {self.name()}")
+
+    def stop(self):
+        # Writes <state>-<time>.pstats, readable with python -m pstats or
+        # snakeviz, and a .txt report with the hottest functions and the
+        # allocation sites whose live memory changed most over the window
+        profile, self._profile = self._profile, None
+        profile.disable()
+        duration = time.perf_counter() - self._start_time
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        report = io.StringIO()
+        frames = max(1, self.frames)
+        report.write(f"{self.name()}: {self.frames} frames in {duration:.2f} s "
+                     f"({duration * 1000 / frames:.2f} ms per frame)\n\n")
+        pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(40)
+
+        # Only Python allocations are traced: a Surface shows up as its
+        # Python object, its pixels are allocated by SDL
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen *>')]
+        growth = after.filter_traces(ignore).compare_to(self._before.filter_traces(ignore), 'lineno')
+        report.write(f"Net Python allocations over the window, traced peak {peak / 1024:.0f} KiB\n")
+        report.write(f"{'KiB':>10} {'blocks':>8} {'KiB/frame':>10}  site\n")
+        for stat in growth[:ALLOC_TOP]:
+            frame = stat.traceback[0]
+            report.write(f"{stat.size_diff / 1024:10.1f} {stat.count_diff:8d} {stat.size_diff / 1024 / frames:10.3f}"
+                         f"  {frame.filename}:{frame.lineno}\n")
+        self._before = None
+
+        # A capture that can't be written is reported and dropped, it must
+        # not take the session down with it
+        base = os.path.join(self.output_dir, f"{self.name()}-{time.strftime('%Y%m%d-%H%M%S')}")
+        try:
+            profile.dump_stats(base + '.pstats')
+            with open(base + '.txt', 'w') as f:
+                f.write(report.getvalue())
+        except OSError as e:
+            print(f"Could not write {self.name()} capture: {e}")
+            return
+        print(f"Wrote {base}.pstats and {base}.txt")
+
+    def name(self):
+        return self.state_names.get(self.state, str(self.state))
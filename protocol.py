@@ -0,0 +1,190 @@
+# binary sensor frames between the ESP32 and the host
+#
+# Sent by sun-control-bt.ino after the host writes "binary\n" (and back to
+# text lines after "text\n"). Every frame is 24 bytes, little endian:
+#
+#   sync    2s   b'\xa5\x5a'
+#   seq     H    frame counter, wraps at 65536
+#   millis  I    device timestamp in ms
+#   ax ay az gx gy gz heat   7h   raw accel, offset-corrected gyro, heat * 100
+#   crc     H    CRC-CCITT (crc_hqx, init 0xFFFF) of everything after sync
+#
+# At 115200 baud that is room for ~480 frames/s, against ~16 bytes per
+# text line that also has to be split and float()-parsed on the host.
+
+import binascii
+import struct
+
+import numpy as np
+
+FRAME = struct.Struct('<2sHI7hH')
+FRAME_SIZE = FRAME.size
+SYNC = b'\xa5\x5a'
+CRC_INIT = 0xFFFF
+HEAT_SCALE = 100
+
+# Fields of a decoded frame, in order
+FIELDS = ('seq', 'millis', 'ax', 'ay', 'az', 'gx', 'gy', 'gz', 'heat')
+FRAME_DTYPE = np.dtype([('sync', '<u2'), ('seq', '<u2'), ('millis', '<u4')]
+                       + [(name, '<i2') for name in FIELDS[2:]] + [('crc', '<u2')])
+
+BULK_FRAMES = 128  # feeds with room for this many frames are decoded with numpy
+
+
+def _crc_word_table():
+    # crc_hqx of every big-endian 16 bit word from a zero register, so many
+    # frames are checked at once two bytes per step
+    byte_table = np.array([binascii.crc_hqx(bytes([i]), 0) for i in range(256)], np.uint32)
+    words = np.arange(65536, dtype=np.uint32)
+    value = np.zeros(65536, np.uint32)
+    for byte in (words >> 8, words & 0xFF):
+        value = ((value << 8) & 0xFFFF) ^ byte_table[(value >> 8) ^ byte]
+    return value.astype(np.uint16)
+
+
+_CRC_WORDS = _crc_word_table()
+_FRAME_BYTES = np.arange(FRAME_SIZE)
+
+
+def crc(payload):
+    return binascii.crc_hqx(payload, CRC_INIT)
+
+
+def crc_many(payloads):
+    # crc() of every row of an (n, even length) uint8 array
+    words = np.ascontiguousarray(payloads).view('>u2')
+    value = np.full(len(payloads), CRC_INIT, np.uint16)
+    for column in words.T:
+        value = _CRC_WORDS[value ^ column]
+    return value
+
+
+def encode_frame(seq, millis, ax, ay, az, gx, gy, gz, heat):
+    # What the firmware sends, used by the emulator
+    clamp = lambda v: max(-32768, min(32767, int(v)))
+    body = FRAME.pack(SYNC, seq & 0xFFFF, int(millis) & 0xFFFFFFFF,
+                      clamp(ax), clamp(ay), clamp(az), clamp(gx), clamp(gy), clamp(gz),
+                      clamp(heat * HEAT_SCALE), 0)
+    return body[:-2] + struct.pack('<H', crc(body[2:-2]))
+
+
+class FrameDecoder:
+    # Turns an arbitrary byte stream into frames. Partial frames are kept for
+    # the next feed(), bytes that don't form a valid frame are skipped until
+    # the next sync, and sequence gaps are counted as lost frames.
+    #
+    # A big feed (a burst, or a reader that fell behind) finds every sync
+    # word in one pass and decodes and CRC-checks all its complete frames
+    # together with numpy. Below about a hundred frames numpy's fixed cost per
+    # call outweighs that, so the usual handful per read is scanned frame by
+    # frame. Both give the same frames and stats.
+    def __init__(self):
+        self._pending = bytearray()
+        self._last_seq = None
+        self.frames = 0
+        self.lost = 0
+        self.crc_errors = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        # Returns a list of (seq, millis, ax, ay, az, gx, gy, gz, heat)
+        buf = self._pending
+        buf += data
+        if len(buf) >= BULK_FRAMES * FRAME_SIZE:
+            frames, pos = self._decode_bulk(buf)
+        else:
+            frames, pos = self._scan(buf)
+        del buf[:pos]
+        return frames
+
+    def _scan(self, buf):
+        frames = []
+        pos = 0
+        end = len(buf)
+        while True:
+            start = buf.find(SYNC, pos)
+            if start < 0:
+                # Keep a trailing sync byte that may be completed next time
+                keep = end - 1 if end > pos and buf[end - 1] == SYNC[0] else end
+                self.skipped_bytes += keep - pos
+                pos = keep
+                break
+            self.skipped_bytes += start - pos
+            if end - start < FRAME_SIZE:
+                pos = start
+                break
+            fields = FRAME.unpack_from(buf, start)
+            if crc(buf[start + 2:start + FRAME_SIZE - 2]) != fields[-1]:
+                # Not a real frame (or a corrupted one), resync from the next byte
+                self.crc_errors += 1
+                self.skipped_bytes += 1
+                pos = start + 1
+                continue
+            seq = fields[1]
+            if self._last_seq is not None:
+                self.lost += (seq - self._last_seq - 1) & 0xFFFF
+            self._last_seq = seq
+            self.frames += 1
+            frames.append(fields[1:-1])
+            pos = start + FRAME_SIZE
+        return frames, pos
+
+    def _decode_bulk(self, buf):
+        end = len(buf)
+        raw = np.frombuffer(buf, np.uint8)
+        syncs = np.flatnonzero((raw[:-1] == SYNC[0]) & (raw[1:] == SYNC[1]))
+        complete = syncs[syncs <= end - FRAME_SIZE]
+        rows = raw[complete[:, None] + _FRAME_BYTES]
+        valid = crc_many(rows[:, 2:-2]) == rows[:, -2:].copy().view('<u2')[:, 0]
+        starts = complete[valid]
+        if np.any(np.diff(starts) < FRAME_SIZE):
+            # A sync word and a matching CRC inside another frame: take them
+            # in stream order, like a byte-by-byte scan would
+            keep = []
+            covered = 0
+            for i, start in enumerate(starts.tolist()):
+                if start >= covered:
+                    keep.append(i)
+                    covered = start + FRAME_SIZE
+            starts = starts[keep]
+            valid = np.isin(complete, starts)
+
+        # Sync words that aren't inside an accepted frame were either bad
+        # frames or the start of one still arriving
+        before = np.searchsorted(starts, syncs, side='right') - 1
+        inside = (before >= 0) & (syncs < starts[np.maximum(before, 0)] + FRAME_SIZE) if len(starts) else \
+            np.zeros(len(syncs), bool)
+        self.crc_errors += int(np.count_nonzero(~inside[:len(complete)] & ~valid))
+        covered = int(starts[-1]) + FRAME_SIZE if len(starts) else 0
+        partial = syncs[len(complete):][~inside[len(complete):]]
+        if len(partial):
+            pos = int(partial[0])
+        elif end > covered and buf[end - 1] == SYNC[0]:
+            pos = end - 1  # a trailing sync byte may be completed next time
+        else:
+            pos = end
+
+        frames = raw[starts[:, None] + _FRAME_BYTES].view(FRAME_DTYPE)[:, 0]
+        del raw  # buf can't be resized while numpy holds a view of it
+        if len(frames):
+            seqs = frames['seq'].astype(np.int64)
+            if self._last_seq is not None:
+                seqs = np.concatenate(([self._last_seq], seqs))
+            self.lost += int(((np.diff(seqs) - 1) & 0xFFFF).sum())
+            self._last_seq = int(frames['seq'][-1])
+        self.frames += len(frames)
+        self.skipped_bytes += pos - len(frames) * FRAME_SIZE
+        return frames[list(FIELDS)].tolist(), pos
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'lost': self.lost,
+            'crc_errors': self.crc_errors,
+            'skipped_bytes': self.skipped_bytes,
+        }
+
+
+def gyro_values(frame):
+    # The (gx, gy, gz) the game reads, same as the text protocol's three columns
+    return frame[5], frame[6], frame[7]
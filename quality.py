@@ -0,0 +1,84 @@
+# adaptive quality
+#
+#   python sun-game.py --quality auto    (or a fixed level: full, reduced, low, minimum)
+#
+# QualityGovernor watches how long recent frames took to draw and steps down
+# a level when the median gets close to the frame budget, so a weak machine
+# loses detail instead of frames. It steps back up only after a long run of
+# frames well under budget, and every change starts a fresh window, so it
+# doesn't flip back and forth between two levels. The median keeps one-off
+# spikes (asset loads, a state change) from costing quality.
+#
+# Each level is a dict of settings the drawing code reads:
+#   sparks            plain particles in an explosion
+#   sprite_coarseness multiplies the explosion's sprite size and angle steps,
+#                     fewer distinct sprites to render and keep
+#   smooth            smoothscale the Earth in the intro, otherwise scale
+#   cross_fade        sun-display blends between sun frames, otherwise cuts
+#   glow              the sun's glow overlay during play
+#   render_scale      resolution the sun is drawn at in sun-display, scaled
+#                     up to the screen
+
+QUALITY_LEVELS = (
+    {'name': 'full', 'sparks': 50, 'sprite_coarseness': 1, 'smooth': True, 'cross_fade': True, 'glow': True,
+     'render_scale': 1.0},
+    {'name': 'reduced', 'sparks': 30, 'sprite_coarseness': 2, 'smooth': True, 'cross_fade': True, 'glow': True,
+     'render_scale': 1.0},
+    {'name': 'low', 'sparks': 20, 'sprite_coarseness': 2, 'smooth': False, 'cross_fade': False, 'glow': True,
+     'render_scale': 0.75},
+    {'name': 'minimum', 'sparks': 10, 'sprite_coarseness': 3, 'smooth': False, 'cross_fade': False, 'glow': False,
+     'render_scale': 0.5},
+)
+QUALITY_NAMES = tuple(level['name'] for level in QUALITY_LEVELS)
+
+DOWN_AT = 0.9  # of the frame budget: a median above this steps down
+UP_AT = 0.6  # a median below this, for up_after frames in a row, steps up
+
+
+class QualityGovernor:
+    def __init__(self, budget_ms, level='auto', window=60, up_after=300):
+        # level: 'auto', or a level name to stay at
+        self.budget_ms = budget_ms
+        self.auto = level == 'auto'
+        self.level = 0 if self.auto else QUALITY_NAMES.index(level)
+        self.window = window  # frames the median is taken over
+        self.up_after = up_after
+        self._samples = []
+        self._calm = 0
+
+    @property
+    def name(self):
+        return QUALITY_LEVELS[self.level]['name']
+
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def frame(self, work_ms):
+        # Call once per frame with the time it took, waiting excluded.
+        # Returns true when the level changed.
+        if not self.auto:
+            return False
+        samples = self._samples
+        samples.append(work_ms)
+        if len(samples) > self.window:
+            del samples[0]
+        if len(samples) < self.window:
+            return False
+        median = sorted(samples)[len(samples) // 2]
+        if median > DOWN_AT * self.budget_ms and self.level < len(QUALITY_LEVELS) - 1:
+            return self._set(self.level + 1, median)
+        if median < UP_AT * self.budget_ms and self.level > 0:
+            self._calm += 1
+            if self._calm >= self.up_after:
+                return self._set(self.level - 1, median)
+        else:
+            self._calm = 0
+        return False
+
+    def _set(self, level, median):
+        self.level = level
+        self._samples = []
+        self._calm = 0
+        print(f"Quality: {self.name} (median frame {median:.1f} ms of {self.budget_ms:.1f})")
+        return True
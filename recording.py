@@ -0,0 +1,152 @@
+# sensor session recording and replay
+#
+#   python sun-game.py --record visitor.sunrec
+#   python sun-game.py --replay visitor.sunrec [--replay-fast]
+#
+# A recording is an append-only file: an 8-byte magic, a version and the
+# number of values per sample, followed by fixed-size records of a float64
+# timestamp (seconds on the recording's own timeline) and float32 values.
+# Replaying pushes the samples back into a SensorBuffer at their recorded
+# times, so the game sees the same input as it did live.
+
+import os
+import struct
+import threading
+
+MAGIC = b'SUNREC\r\n'
+VERSION = 1
+HEADER = struct.Struct('<8sHH')
+
+
+def record_struct(num_parts):
+    return struct.Struct(f'<d{num_parts}f')
+
+
+class Timeline:
+    # Session time that only runs while resumed, e.g. only during game play,
+    # so a recording and its replay line up however long the title screen sat
+    def __init__(self):
+        self.offset = None
+        self.paused_at = None
+        self.running = False
+
+    def resume(self, now):
+        if self.running:
+            return
+        if self.offset is None:
+            self.offset = now
+        elif self.paused_at is not None:
+            self.offset += now - self.paused_at
+        self.paused_at = None
+        self.running = True
+
+    def pause(self, now):
+        if self.running:
+            self.paused_at = now
+            self.running = False
+
+    def local(self, now):
+        return max(0.0, now - self.offset)
+
+
+class SessionRecorder:
+    def __init__(self, path, num_parts, flush_every=64):
+        self.path = path
+        self.num_parts = num_parts
+        self.record = record_struct(num_parts)
+        self.timeline = Timeline()
+        self.flush_every = flush_every
+        self.samples = 0
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            magic, version, parts = read_header(path)
+            if parts != num_parts:
+                raise ValueError(f"{path} holds {parts}-value samples, not {num_parts}")
+        self._file = open(path, 'ab')
+        if new_file:
+            self._file.write(HEADER.pack(MAGIC, VERSION, num_parts))
+
+    def write(self, timestamp, values):
+        # Called for every sample, from the reader thread. Dropped while paused.
+        with self._lock:
+            if not self.timeline.running or self._file is None:
+                return
+            self._file.write(self.record.pack(self.timeline.local(timestamp), *values))
+            self.samples += 1
+            if self.samples % self.flush_every == 0:
+                self._file.flush()
+
+    def resume(self, now):
+        with self._lock:
+            self.timeline.resume(now)
+
+    def pause(self, now):
+        with self._lock:
+            self.timeline.pause(now)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        print(f"Recorded {self.samples} sensor samples to {self.path}")
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic, version, num_parts = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a sensor recording")
+    if version != VERSION:
+        raise ValueError(f"{path} is recording version {version}, expected {VERSION}")
+    return magic, version, num_parts
+
+
+def read_recording(path):
+    # -> (num_parts, [(timestamp, values), ...]); a torn last record is ignored
+    _, _, num_parts = read_header(path)
+    record = record_struct(num_parts)
+    with open(path, 'rb') as f:
+        data = f.read()[HEADER.size:]
+    usable = len(data) - len(data) % record.size
+    samples = [(fields[0], fields[1:]) for fields in record.iter_unpack(data[:usable])]
+    return num_parts, samples
+
+
+class SensorReplay:
+    # Feeds a recording into a SensorBuffer. Call update(now) every frame;
+    # samples are pushed once their recorded time has passed on the timeline.
+    def __init__(self, path, buffer):
+        self.path = path
+        self.buffer = buffer
+        self.num_parts, self.samples = read_recording(path)
+        if self.num_parts != buffer.num_parts:
+            raise ValueError(f"{path} holds {self.num_parts}-value samples, not {buffer.num_parts}")
+        self.timeline = Timeline()
+        self.position = 0
+
+    @property
+    def finished(self):
+        return self.position >= len(self.samples)
+
+    def resume(self, now):
+        self.timeline.resume(now)
+
+    def pause(self, now):
+        self.timeline.pause(now)
+
+    def time_past_end(self, now):
+        # How far the timeline has run beyond the last sample, in seconds
+        if not self.samples or self.timeline.offset is None:
+            return 0.0
+        return self.timeline.local(now) - self.samples[-1][0]
+
+    def update(self, now):
+        if not self.timeline.running:
+            return
+        t = self.timeline.local(now)
+        while self.position < len(self.samples) and self.samples[self.position][0] <= t:
+            timestamp, values = self.samples[self.position]
+            self.buffer.push(self.timeline.offset + timestamp, values)
+            self.position += 1
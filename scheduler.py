@@ -0,0 +1,42 @@
+# frame pacing
+#
+# Animated scenes run at the full frame rate through clock.tick. Static ones
+# (the title screen, game over once the explosion has burned out) block on
+# the event queue instead and only redraw a few times a second, for what
+# still changes slowly like the loading bar. Input ends the wait straight
+# away, so the frame that handles it runs at once. An idle kiosk then costs
+# next to no CPU.
+
+import pygame
+
+IDLE_FPS = 4
+
+
+class FrameScheduler:
+    def __init__(self, clock, fps, idle_fps=IDLE_FPS, virtual=False):
+        self.clock = clock
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.virtual = virtual  # on a virtual clock: never wait, run flat out
+        self.idled = False  # whether the last wait was an idle one
+        self._woken_by = []
+
+    def events(self):
+        # Use instead of pygame.event.get(): includes the event that ended
+        # an idle wait
+        events = self._woken_by + pygame.event.get()
+        self._woken_by = []
+        return events
+
+    def wait(self, idle=False):
+        # Call once at the end of every frame. idle: nothing on screen moves
+        # unless something happens.
+        self.idled = idle and not self.virtual
+        if self.virtual:
+            self.clock.tick(0)
+        elif not idle:
+            self.clock.tick(self.fps)
+        else:
+            event = pygame.event.wait(int(1000 / self.idle_fps))
+            if event.type != pygame.NOEVENT:
+                self._woken_by.append(event)
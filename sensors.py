@@ -0,0 +1,187 @@
+# sensor ingestion off the render thread
+#
+# SerialSensorReader reads the ESP32's samples (text "gx gy gz" lines or
+# binary frames, see protocol.py) continuously on its own thread and pushes
+# every parsed sample, with a host timestamp, into a SensorBuffer. The game
+# loop only ever queries the buffer, which never blocks on I/O and never
+# throws samples away the way reset_input_buffer did.
+
+import threading
+import time
+
+import numpy as np
+
+from protocol import FrameDecoder, gyro_values
+
+
+class SensorBuffer:
+    # Fixed-size ring buffer of (timestamp, values) samples
+    def __init__(self, num_parts, capacity=1024):
+        self.num_parts = num_parts
+        self.capacity = capacity
+        self._times = [0.0] * capacity
+        self._values = [(0.0,) * num_parts] * capacity
+        self._count = 0  # total samples ever pushed
+        self._read = 0  # value of _count at the last since_last()
+        self.overruns = 0  # samples overwritten before since_last() saw them
+        self.recorder = None  # optional recording.SessionRecorder, gets every sample
+        self._lock = threading.Lock()
+
+    def push(self, timestamp, values):
+        with self._lock:
+            slot = self._count % self.capacity
+            self._times[slot] = timestamp
+            self._values[slot] = tuple(values)
+            self._count += 1
+        if self.recorder is not None:
+            self.recorder.write(timestamp, values)
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def _samples(self, start, end):
+        return [(self._times[i % self.capacity], self._values[i % self.capacity]) for i in range(start, end)]
+
+    def latest(self):
+        # Most recent (timestamp, values), or None before the first sample
+        with self._lock:
+            if self._count == 0:
+                return None
+            slot = (self._count - 1) % self.capacity
+            return self._times[slot], self._values[slot]
+
+    def since_last(self):
+        # Every sample pushed since the previous call, oldest first
+        with self._lock:
+            start = self._read
+            oldest = self._count - self.capacity
+            if start < oldest:
+                self.overruns += oldest - start
+                start = oldest
+            self._read = self._count
+            return self._samples(start, self._count)
+
+    def since_last_block(self):
+        # since_last() as numpy arrays: (n,) timestamps and (n, num_parts)
+        # values
+        samples = self.since_last()
+        times = np.fromiter((t for t, _ in samples), np.float64, len(samples))
+        values = np.array([v for _, v in samples], np.float64).reshape(len(samples), self.num_parts)
+        return times, values
+
+    def frame_values(self):
+        # One value per frame: the mean of everything that came in since the
+        # last frame, else the latest sample held, else zeros. The sun
+        # scripts filter every sample through since_last() instead; this is
+        # kept for demo/demo.py, which moves its sun once per frame.
+        samples = self.since_last()
+        if samples:
+            return mean_values(samples, self.num_parts)
+        latest = self.latest()
+        return list(latest[1]) if latest else [0.0] * self.num_parts
+
+    def window(self, seconds, now=None):
+        # Samples from the last `seconds`, oldest first
+        with self._lock:
+            if now is None:
+                now = self._times[(self._count - 1) % self.capacity] if self._count else 0.0
+            start = max(0, self._count - self.capacity)
+            end = self._count
+            while end > start and self._times[(end - 1) % self.capacity] >= now - seconds:
+                end -= 1
+            return self._samples(end, self._count)
+
+
+def mean_values(samples, num_parts):
+    # Per-axis mean of a list of (timestamp, values)
+    if not samples:
+        return [0.0] * num_parts
+    sums = [0.0] * num_parts
+    for _, values in samples:
+        for i in range(num_parts):
+            sums[i] += values[i]
+    return [s / len(samples) for s in sums]
+
+
+def parse_line(raw, num_parts):
+    # bytes from the port -> list of floats, or None for anything malformed
+    line = raw.decode('utf-8', errors='ignore').strip()
+    if not line:
+        return None
+    parts = line.split()
+    if len(parts) != num_parts:
+        return None
+    try:
+        return [float(x) for x in parts]
+    except ValueError:
+        print(f"Malformed float in line: {line}")
+        return None
+
+
+class SerialSensorReader:
+    # protocol is 'text' (one "gx gy gz" line per sample) or 'binary' (the
+    # framed protocol in protocol.py, switched on by sending "binary").
+    # Samples are stamped with perf_counter(): on Windows before Python 3.13
+    # monotonic() only ticks every 15.6 ms, so samples a frame apart would
+    # often share a stamp and the filters would give them no time at all.
+    def __init__(self, port, num_parts, buffer=None, clock=time.perf_counter, protocol='text'):
+        self.port = port
+        self.num_parts = num_parts
+        self.buffer = buffer if buffer is not None else SensorBuffer(num_parts)
+        self.clock = clock
+        self.protocol = protocol
+        self.malformed = 0
+        self.decoder = FrameDecoder() if protocol == 'binary' else None
+        self._device_offset = None  # host time minus device time, binary only
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sensor-reader", daemon=True)
+
+    def start(self):
+        if self.protocol == 'binary':
+            self.port.write(b"binary\n")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+    @property
+    def alive(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        read = self._read_binary if self.protocol == 'binary' else self._read_text
+        while not self._stop.is_set():
+            try:
+                read()  # blocks up to the port timeout, off the render thread
+            except Exception as e:
+                print(f"Sensor reader stopped: {e}")
+                return
+
+    def _read_text(self):
+        raw = self.port.readline()
+        if not raw:
+            return
+        values = parse_line(raw, self.num_parts)
+        if values is None:
+            self.malformed += 1
+            return
+        self.buffer.push(self.clock(), values)
+
+    def _read_binary(self):
+        data = self.port.read(max(1, self.port.in_waiting))
+        if not data:
+            return
+        frames = self.decoder.feed(data)
+        if not frames:
+            return
+        now = self.clock()
+        for frame in frames:
+            # Stamp with the device clock mapped onto the host clock, so a burst
+            # read in one go keeps its real spacing. Re-anchor if the device
+            # restarted or the mapping has drifted off.
+            device_time = frame[1] / 1000
+            if self._device_offset is None or abs(self._device_offset + device_time - now) > 1.0:
+                self._device_offset = now - device_time
+            self.buffer.push(self._device_offset + device_time, gyro_values(frame))
@@ -0,0 +1,94 @@
+# pre-rendered particle sprites for the explosion
+#
+# Particles used to allocate, draw, scale, mask and rotate a fresh surface
+# each, every frame. Here every sprite is rendered once per quantized bucket
+# and looked up after that:
+#   circles      (diameter, alpha bucket, colour bucket), shared by all sparks
+#   image pieces (piece, size bucket, angle bucket, alpha bucket), circle-
+#                masked, rotated and faded
+
+import numpy as np
+import pygame
+
+ALPHA_LEVELS = 16  # circle alpha buckets
+COLOR_STEP = 16  # circle colour channels are rounded to this
+SIZE_STEP = 4  # piece sizes are rounded to this many pixels
+ANGLE_STEP = 15  # piece rotations are rounded to this many degrees
+
+# Circles don't depend on the sun frame, so every explosion shares them
+_circles = {}
+
+
+class ParticleSprites:
+    def __init__(self, pieces=(), size_step=SIZE_STEP, angle_step=ANGLE_STEP):
+        self.pieces = list(pieces)
+        self.size_step = size_step
+        self.angle_step = angle_step
+        self._pieces = {}
+        self._rotated = {}
+        self._masked = {}
+
+    def circle_buckets(self, size, life, color):
+        # numpy arrays of particle size, life and (n, 3) colour -> the
+        # diameter, radius, alpha and colour buckets to look circles up by
+        diameter = (size * 2).astype(np.int32)
+        radius = size.astype(np.int32)
+        alpha = np.minimum(255, np.rint(life * ALPHA_LEVELS).astype(np.int32) * (256 // ALPHA_LEVELS))
+        color = np.minimum(255, np.rint(color / COLOR_STEP).astype(np.int32) * COLOR_STEP)
+        return diameter, radius, alpha, color
+
+    def circle(self, diameter, radius, alpha, color):
+        # Same sprite Particle.draw used to build: a circle of radius int(size)
+        # on an int(size * 2) square, faded by life
+        key = (diameter, radius, alpha, color)
+        sprite = _circles.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((diameter, diameter), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, (*color, alpha), (radius, radius), radius)
+            _circles[key] = sprite
+        return sprite
+
+    def piece_buckets(self, mask_size, rotation, life):
+        # numpy arrays of on-screen piece size, rotation and life -> size,
+        # angle and alpha buckets
+        size = np.maximum(self.size_step, np.rint(mask_size / self.size_step).astype(np.int32) * self.size_step)
+        angle = np.rint(rotation / self.angle_step).astype(np.int32) * self.angle_step % 360
+        alpha = np.minimum(255, np.rint(life * ALPHA_LEVELS).astype(np.int32) * (256 // ALPHA_LEVELS))
+        return size, angle, alpha
+
+    def _masked_piece(self, index, mask_size):
+        # Piece scaled to mask_size and cut to a circle, before rotation
+        key = (index, mask_size)
+        masked = self._masked.get(key)
+        if masked is None:
+            masked = pygame.transform.scale(self.pieces[index], (mask_size, mask_size))
+            mask = pygame.Surface((mask_size, mask_size), pygame.SRCALPHA)
+            pygame.draw.circle(mask, (255, 255, 255, 255), (mask_size // 2, mask_size // 2), mask_size // 2)
+            masked.blit(mask, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+            self._masked[key] = masked
+        return masked
+
+    def _rotated_piece(self, index, size, angle):
+        key = (index, size, angle)
+        rotated = self._rotated.get(key)
+        if rotated is None:
+            rotated = pygame.transform.rotate(self._masked_piece(index, size), angle)
+            self._rotated[key] = rotated
+        return rotated
+
+    def piece(self, index, size, angle, alpha):
+        # Buckets as returned by piece_buckets(). The fade is baked into the
+        # sprite: set_alpha on a per-pixel alpha surface makes every blit of
+        # it several times slower.
+        key = (index, size, angle, alpha)
+        sprite = self._pieces.get(key)
+        if sprite is None:
+            sprite = self._rotated_piece(index, size, angle)
+            if alpha < 255:
+                sprite = sprite.copy()
+                sprite.fill((255, 255, 255, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+            self._pieces[key] = sprite
+        return sprite
+
+    def __len__(self):
+        return len(self._pieces)
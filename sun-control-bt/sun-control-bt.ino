@@ -22,6 +22,23 @@ int vibrationLevel = 0;
 
 bool flaring = false;
 
+// Framed binary protocol, switched on by the host sending "binary" (see
+// protocol.py on the host side). Text lines stay the default.
+bool binaryMode = false;
+const int TEXT_INTERVAL_MS = 16;    // ~60 lines/s, matches the game FPS
+const int BINARY_INTERVAL_MS = 5;   // ~200 frames/s, 24 bytes each fits 115200 baud easily
+uint16_t frameSeq = 0;
+
+struct __attribute__((packed)) SensorFrame {
+  uint8_t sync[2];     // 0xA5 0x5A
+  uint16_t seq;
+  uint32_t millis;
+  int16_t ax, ay, az;
+  int16_t gx, gy, gz;  // offset-corrected, same as the text columns
+  int16_t heat;        // heat * 100
+  uint16_t crc;        // CRC-CCITT (init 0xFFFF) of everything after sync
+};
+
 void readMPU() {
   mpu.getMotion6(&ax, &ay, &az, &gx, &gy, &gz);
 }
@@ -89,7 +106,11 @@ void loop() {
   readThermistor();
   readMPU();
   sendSensorData();
-  sendSensorDataBT();
+  if (binaryMode) {
+    sendSensorFrameBT();
+  } else {
+    sendSensorDataBT();
+  }
 
   if (!flaring){
     vibration_feedback();
@@ -98,8 +119,8 @@ void loop() {
     flaring = false;
   }
 
-  // small delay to match FPS of game
-  delay(16);
+  // small delay to match FPS of game, shorter in binary mode for a higher sample rate
+  delay(binaryMode ? BINARY_INTERVAL_MS : TEXT_INTERVAL_MS);
 }
 
 void readSerialCommand() {
@@ -160,6 +181,13 @@ void readBTCommand() {
       else if (incomingCommand == "ping") {
         SerialBT.println("pong");
       } 
+      else if (incomingCommand == "binary") {
+        if (!binaryMode) frameSeq = 0;
+        binaryMode = true;
+      } 
+      else if (incomingCommand == "text") {
+        binaryMode = false;
+      } 
       else {
         SerialBT.print("Unknown command: ");
         SerialBT.println(incomingCommand);
@@ -222,6 +250,44 @@ void sendSensorDataBT() {
   //SerialBT.println(gz);
 }
 
+int16_t clamp16(int32_t value) {
+  if (value > 32767) return 32767;
+  if (value < -32768) return -32768;
+  return value;
+}
+
+uint16_t crc16_ccitt(const uint8_t *data, size_t len, uint16_t crc) {
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void sendSensorFrameBT() {
+  // same offsets as sendSensorDataBT
+  int z_offset_ = -180;
+  int x_offset_ = -240;
+  int y_offset_ = -65;
+
+  SensorFrame frame;
+  frame.sync[0] = 0xA5;
+  frame.sync[1] = 0x5A;
+  frame.seq = frameSeq++;
+  frame.millis = millis();
+  frame.ax = ax;
+  frame.ay = ay;
+  frame.az = az;
+  frame.gx = clamp16((int32_t)gx - x_offset_);
+  frame.gy = clamp16((int32_t)gy - y_offset_);
+  frame.gz = clamp16((int32_t)gz - z_offset_);
+  frame.heat = clamp16((int32_t)(heat * 100));
+  frame.crc = crc16_ccitt((const uint8_t *)&frame + 2, sizeof(frame) - 4, 0xFFFF);
+  SerialBT.write((const uint8_t *)&frame, sizeof(frame));
+}
+
 void vibrate(int level) {
   vibrationLevel = constrain(level, 0, 5);
   int pwmDuty = map(vibrationLevel, 0, 5, 0, 255);
@@ -5,22 +5,51 @@ import time
 import pygame
 import os
 import traceback
-from collections import deque
-
-# may not be COM6 depending on your system, must pair to device first
-port = 'COM6'
-try:
-    bt = serial.Serial(port=port, baudrate=115200, timeout=1)
-    time.sleep(1)  # Let the connection settle
-    print(f"Connected to Serial on {port}")
-except:
-    print("Skipping Serial connection.")
+import argparse
+from dirty import DirtyRects
+from filters import FILTERS, DriftIntegrator, SampleTimer, make_filter
+from compositor import Compositor, LAYER_SUN
+from quality import QUALITY_NAMES, QualityGovernor
+from sensors import SensorBuffer, SerialSensorReader
+from recording import SensorReplay, SessionRecorder
+
+parser = argparse.ArgumentParser(description="Sun Display")
+parser.add_argument('--dirty-rects', action='store_true',
+                    help='Only present the screen areas that changed instead of flipping the whole frame')
+parser.add_argument('--port', default='COM6',
+                    help='Sensor serial port, may not be COM6 depending on your system, must pair to device first')
+parser.add_argument('--protocol', choices=('text', 'binary'), default='text',
+                    help='Sensor protocol: text lines, or framed binary (see protocol.py)')
+parser.add_argument('--record', metavar='PATH', default=None, help='Append every sensor sample to a recording file')
+parser.add_argument('--replay', metavar='PATH', default=None, help='Take sensor input from a recording instead of the serial port')
+parser.add_argument('--filter', choices=sorted(FILTERS), default='average',
+                    help='Smoothing for the sensor spin rate (see filters.py)')
+parser.add_argument('--quality', choices=('auto',) + QUALITY_NAMES, default='auto',
+                    help='Detail level, or auto to follow the frame time (see quality.py)')
+args = parser.parse_args()
+
+port = args.port
+sensors = SensorBuffer(3)
+sensor_reader = None
+replay = SensorReplay(args.replay, sensors) if args.replay else None
+recorder = SessionRecorder(args.record, 3) if args.record else None
+sensors.recorder = recorder
+if not replay:
+    try:
+        bt = serial.Serial(port=port, baudrate=115200, timeout=1)
+        time.sleep(1)  # Let the connection settle
+        print(f"Connected to Serial on {port}")
+        sensor_reader = SerialSensorReader(bt, 3, sensors, protocol=args.protocol).start()
+    except:
+        print("Skipping Serial connection.")
 
 pygame.init()
 SCREEN_SIZE = 1000
 screen = pygame.display.set_mode((SCREEN_SIZE, SCREEN_SIZE))
 pygame.display.set_caption("Sun Simulation")
 clock = pygame.time.Clock()
+dirty = DirtyRects(screen, enabled=args.dirty_rects)
+compositor = Compositor(screen)
 print("Set up PyGame.")
 time.sleep(1)
 
@@ -46,72 +75,107 @@ FPS = 60
 running = True
 frame_index = 0
 rotation_speed = 0.1 # no lower than .2
-rotation_speed_history = deque([rotation_speed])
+rotation_filter = make_filter(args.filter)
+rotation_filter.reset(rotation_speed)
+sample_timer = SampleTimer()
+drift_integrator = DriftIntegrator(frame_rate=FPS)
+quality = QualityGovernor(1000 / FPS, args.quality)
+
+# Below full render scale the sun is blended at a lower resolution and
+# scaled up to its place on screen. Frames are shrunk once each, as they
+# come up, for the current scale.
+render_scale = 1.0
+scaled_frames = {}
+sun_render = None
+sun_upscaled = None
+
+def scaled_frame(index):
+    frame = scaled_frames.get(index)
+    if frame is None:
+        frame = scaled_frames[index] = pygame.transform.smoothscale(sun_frames[index], sun_render.get_size())
+    return frame
 
 x_drift = 0
 y_drift = 0
 
-def read_arduino_sensor_data(bt, num_parts):
-    if bt and bt.in_waiting > 0:
-        line = bt.readline().decode('utf-8', errors='ignore').strip()
-        if line:
-            parts = line.split()
-            if len(parts) == num_parts:
-                try:
-                    return [float(x) for x in parts]
-                except ValueError:
-                    print(f"Malformed float in line: {line}")
-    return [float(0) for _ in range(num_parts)]
+# Recording and replay start with the display, not while it was loading
+sensors.since_last()  # drop samples that piled up while loading
+if recorder:
+    recorder.resume(time.perf_counter())
+if replay:
+    replay.resume(time.perf_counter())
 
 while running:
+    frame_start = time.perf_counter()
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
 
-    sensor_data = read_arduino_sensor_data(bt, 3)
-    sensor_rotation = sensor_data[2] / 2000
-    sensor_drift_x = sensor_data[0] / 2000
-    sensor_drift_y = sensor_data[1] / 2000
+    if replay:
+        replay.update(time.perf_counter())
+    # Every sample that came in since the last frame, as one block
+    sample_times, sensor_data = sensors.since_last_block()
+    if len(sample_times):
+        dts = sample_timer.steps(sample_times)
+        sensor_rotation = sensor_data[:, 2] / 2000
 
-    # if -0.2 < sensor_rotation < 0.2:
-    #     sensor_rotation = 0.2 if sensor_rotation > 0 else -0.2
+        # if -0.2 < sensor_rotation < 0.2:
+        #     sensor_rotation = 0.2 if sensor_rotation > 0 else -0.2
 
-    # LIVE ROTATION CHANGING
-    rotation_speed_history.append(sensor_rotation)
-    if len(rotation_speed_history) > 10:
-        rotation_speed_history.popleft()
-    rotation_speed = sum(rotation_speed_history) / len(rotation_speed_history)
+        # LIVE ROTATION CHANGING
+        rotation_speed = rotation_filter.update_block(sensor_rotation, dts)
 
-    # LIVE TILT SHIFTING
-    dx = sensor_drift_x
-    dy = sensor_drift_y
-    x_drift += dx - (x_drift / 100)
-    y_drift += dy - (y_drift / 100)
+        # LIVE TILT SHIFTING, over the time the samples cover
+        x_drift, y_drift = drift_integrator.integrate(
+            (x_drift, y_drift), sensor_data[:, :2] / 2000, dts).tolist()
 
     # Clear screen
-    screen.fill((0, 0, 0))
+    dirty.clear()
     frame_base = int(frame_index) % len(sun_frames)
     frame_next = (frame_base + 1) % len(sun_frames)
     blend_ratio = frame_index - frame_base  # value between 0 and 1
 
-    frame_surface = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE), pygame.SRCALPHA)
-
     x_offset = ((SCREEN_SIZE - 512) // 2) + x_drift
     y_offset = ((SCREEN_SIZE - 512) // 2) + y_drift
     alpha_next = int(blend_ratio * 255)
     alpha_base = 255 - alpha_next 
-    sun_frames[frame_base].set_alpha(alpha_base)
-    sun_frames[frame_next].set_alpha(alpha_next)
-    frame_surface.blit(sun_frames[frame_base], (x_offset, y_offset))
-    frame_surface.blit(sun_frames[frame_next], (x_offset, y_offset))
-    sun_frames[frame_base].set_alpha(255)
-    sun_frames[frame_next].set_alpha(255)
-
-    screen.blit(frame_surface, (0, 0))
+    settings = quality.settings
+    if not settings['cross_fade']:
+        # Cut to whichever frame is closer instead of blending the two
+        if alpha_next > alpha_base:
+            frame_base = frame_next
+        alpha_base = 255
+        alpha_next = 0
+    if settings['render_scale'] != render_scale:
+        render_scale = settings['render_scale']
+        scaled_frames = {}
+        sun_size = sun_frames[0].get_size()
+        sun_render = pygame.Surface([max(1, int(edge * render_scale)) for edge in sun_size])
+        sun_upscaled = pygame.Surface(sun_size)
+    if render_scale < 1:
+        sun_render.fill((0, 0, 0))
+        for index, alpha in ((frame_base, alpha_base), (frame_next, alpha_next)):
+            if alpha > 0:
+                image = scaled_frame(index)
+                image.set_alpha(alpha)
+                sun_render.blit(image, (0, 0))
+        pygame.transform.scale(sun_render, sun_upscaled.get_size(), sun_upscaled)
+        compositor.add(LAYER_SUN, sun_upscaled, (x_offset, y_offset))
+    else:
+        compositor.add(LAYER_SUN, sun_frames[frame_base], (x_offset, y_offset), alpha=alpha_base)
+        if alpha_next > 0:
+            compositor.add(LAYER_SUN, sun_frames[frame_next], (x_offset, y_offset), alpha=alpha_next)
+    dirty.add_all(compositor.render())
+
     #print(f"Showing frame {int(frame_index) % len(sun_frames)}")
 
-    pygame.display.flip()
+    dirty.present()
     frame_index += rotation_speed
+    quality.frame((time.perf_counter() - frame_start) * 1000)
     clock.tick(FPS)
 
+if sensor_reader is not None:
+    sensor_reader.stop()
+if recorder:
+    recorder.close()
 pygame.quit()
@@ -3,11 +3,26 @@ import time
 import pygame
 import os
 import traceback
-from collections import deque
 import math
 import argparse
 import random
-from explosion import ExplosionSystem
+from explosion import EXPLOSION_MODES, ExplosionSystem, prepare_explosion
+from assets import AssetLoader, load_earth_stage, load_sun_frames
+from benchmark import Benchmark, VirtualClock
+from camera import Camera
+from filters import FILTERS, DriftIntegrator, SampleTimer, make_filter
+from glow import GlowCache
+from profiler import FrameProfiler, StateCapture
+from quality import QUALITY_NAMES, QualityGovernor
+from scheduler import FrameScheduler
+from sensors import SensorBuffer, SerialSensorReader
+from recording import SensorReplay, SessionRecorder
+from compositor import (Compositor, LAYER_BACKGROUND_EARTH, LAYER_FOREGROUND_EARTH,
+                        LAYER_GLOW, LAYER_HUD, LAYER_SUN)
+from dirty import DirtyRects
+from transitions import StageCrossFade
+from text import TextCache, TextCrawl
+from timestep import SIM_RATE, FixedTimestep
 
 # Game States
 STATE_TITLE = 0
@@ -17,6 +32,15 @@ STATE_GAME_PLAY = 4
 STATE_GAME_OVER = 5
 STATE_FINAL_ZOOM = 6
 
+STATE_NAMES = {
+    STATE_TITLE: "STATE_TITLE",
+    STATE_SUN_RISING: "STATE_SUN_RISING",
+    STATE_EARTH_INTRO: "STATE_EARTH_INTRO",
+    STATE_GAME_PLAY: "STATE_GAME_PLAY",
+    STATE_GAME_OVER: "STATE_GAME_OVER",
+    STATE_FINAL_ZOOM: "STATE_FINAL_ZOOM",
+}
+
 # Add this near the other constants at the top of the file
 EARTH_MESSAGES = {
     0: "The early Earth is a molten ball, condensed from the Sun's debris",
@@ -31,23 +55,108 @@ EARTH_MESSAGES = {
 MESSAGE_DISPLAY_DURATION = 3500  # 2 seconds in milliseconds
 
 class GameState:
-    def __init__(self):
+    def __init__(self, explosion_mode='live', quality=None):
         self.current_state = STATE_TITLE
         self.explosion = None
         self.message_start_time = 0
         self.current_message = None
-        
-    def start_explosion(self, x, y, sun_frame):
-        self.explosion = ExplosionSystem(x, y, sun_frame)
-        
+        self.explosion_mode = explosion_mode  # how prepared explosions are built, see prepare_explosion()
+        self.quality = quality  # QualityGovernor whose level explosions are built at
+        # Explosions are built on a loader thread and only ever handed over
+        # on the game's thread, in collect_explosion()
+        self.prepared_explosion = None  # ExplosionSystem or BakedExplosion ready to go
+        self.explosion_job = None  # loader job building the next one
+        self.explosion_failed = False  # the last job raised, don't keep retrying it
+        self.explosion_refreshed = False
+        self._explosion_jobs = 0
+        self._superseded_jobs = []  # older jobs still running, their results are dropped
+
+    def prepare_explosion(self, loader, sun_frame):
+        # Builds an explosion of this sun frame on a loader thread, so game
+        # over doesn't stall on it. The seed is drawn here, on the game's
+        # thread, so what gets built doesn't depend on thread timing.
+        if self.explosion_job:
+            self._superseded_jobs.append(self.explosion_job)
+        self._explosion_jobs += 1
+        self.explosion_job = f'explosion_{self._explosion_jobs}'
+        settings = self.quality.settings
+        loader.submit(self.explosion_job, prepare_explosion, sun_frame, random.getrandbits(32),
+                      settings['sparks'], self.explosion_mode, settings['sprite_coarseness'], priority=2)
+
+    def collect_explosion(self, loader, wait=False):
+        # Call every frame: takes the explosion of the latest job once it's
+        # done (wait: block until it is). A job that raised is reported
+        # once, and not resubmitted until the next round.
+        for job in [job for job in self._superseded_jobs if loader.ready(job)]:
+            self._superseded_jobs.remove(job)
+            try:
+                loader.take(job)
+            except Exception:
+                pass  # superseded anyway
+        job = self.explosion_job
+        if job is None or not (wait or loader.ready(job)):
+            return
+        self.explosion_job = None
+        try:
+            self.prepared_explosion = loader.take(job)
+        except Exception:
+            traceback.print_exc()
+            print("Could not prepare the explosion ahead, game over will build it")
+            self.explosion_failed = True
+
+    def start_explosion(self, x, y, sun_frame, wait_for=None):
+        # Uses the latest prepared explosion if there is one, otherwise cuts
+        # up sun_frame now (live, baking here would stall). wait_for: a
+        # loader to wait on for a preparation still running, for
+        # deterministic runs
+        if wait_for is not None:
+            self.collect_explosion(wait_for, wait=True)
+        prepared, self.prepared_explosion = self.prepared_explosion, None
+        if prepared is not None:
+            self.explosion = prepared
+            self.explosion.place(x, y)
+        else:
+            settings = self.quality.settings
+            self.explosion = ExplosionSystem(x, y, sun_frame, settings['sparks'],
+                                             coarseness=settings['sprite_coarseness'])
+
     def reset_explosion(self):
         self.explosion = None
+        self.explosion_refreshed = False
+        self.explosion_failed = False
 
 # Animation timing constants (in milliseconds)
 RISING_TEXT_DURATION = 18000  # Time for text to rise
 RISING_SUN_DURATION = 8000   # Time for sun to rise and reach full spin
 FINAL_RISING_PAUSE = 2000    # Brief pause at full spin before Earth intro
 
+RISING_TEXTS = [
+    "Since ancient times, cultures around the world have had Sun gods.",
+    "Apollo. Ra. Sol Invictus. Helios.",
+    "And now you. ",
+    "",
+    "",
+    "Imagine you now hold the power of the Sun",
+    "in the palm of your hand—because you do.",
+    "",
+    "",
+    "A flick of your wrist",
+    "and all life on Earth is gone,",
+    "along with the rest of the solar system,",
+    "in a single flash of sunlight.",
+    "",
+    "",
+    "The power of a billions of ",
+    "thermonuclear bombs every single second,",
+    "and stability relies on you.",
+    "",
+    "",
+    "Keep the Sun spinning and stable. ",
+    "Or don't. ",
+    "You're the sun god. "
+]
+LINE_SPACING = 60  # Vertical distance between crawl lines
+
 # Target spin speed for stable spinning
 TARGET_SPIN_SPEED = 0.8
 
@@ -66,22 +175,80 @@ EARTH_TRANSITION_DURATION = 2000  # 2 seconds for fade transition
 # Parse command-line arguments
 parser = argparse.ArgumentParser(description="Sun Simulation Game")
 parser.add_argument('--rotation', type=float, default=None, help='Constant sun spin rate (disables Arduino)')
+parser.add_argument('--port', default='COM6',
+                    help="Sensor serial port, e.g. COM6 or /dev/tty.ESP32Sun (must pair to device first)")
+parser.add_argument('--protocol', choices=('text', 'binary'), default='text',
+                    help='Sensor protocol: text lines, or framed binary (see protocol.py)')
+parser.add_argument('--filter', choices=sorted(FILTERS), default='average',
+                    help='Smoothing for the sensor spin rate (see filters.py)')
+parser.add_argument('--explosion', choices=EXPLOSION_MODES, default='live',
+                    help='Game over explosion: simulated live, or baked ahead of time for a fixed cost per frame')
+parser.add_argument('--fps', type=int, default=60,
+                    help='Frames rendered per second. The game itself always runs at 60 ticks per second.')
+parser.add_argument('--quality', choices=('auto',) + QUALITY_NAMES, default='auto',
+                    help='Detail level, or auto to follow the frame time (see quality.py). '
+                         'Auto stays at full on a virtual clock, so runs repeat.')
+parser.add_argument('--no-frame-cache', action='store_true', help='Always decode sun frames from PNG instead of the on-disk cache')
+parser.add_argument('--dirty-rects', action='store_true',
+                    help='Only present the screen areas that changed instead of flipping the whole frame')
+parser.add_argument('--benchmark', metavar='PATH', default=None,
+                    help='Run headless through every state with scripted input and write frame stats as JSON (- for stdout)')
+parser.add_argument('--record', metavar='PATH', default=None,
+                    help='Append every sensor sample during game play to a recording file')
+parser.add_argument('--replay', metavar='PATH', default=None,
+                    help='Take sensor input from a recording instead of the serial port')
+parser.add_argument('--replay-fast', action='store_true',
+                    help='With --replay: start automatically, run uncapped on a virtual clock and quit when the recording ends')
+parser.add_argument('--trace', metavar='PATH', default=None,
+                    help='Write a Chrome/Perfetto trace of every frame\'s sections to PATH at exit (F3 shows them live)')
+parser.add_argument('--profile-state', metavar='STATE', default=None,
+                    type=lambda name: name.upper() if name.upper().startswith('STATE_') else 'STATE_' + name.upper(),
+                    choices=sorted(STATE_NAMES.values()),
+                    help='cProfile and tracemalloc the first window of this state, e.g. earth_intro (F4 captures the current one)')
+parser.add_argument('--profile-dir', metavar='DIR', default='.', help='Where --profile-state and F4 write their reports')
+parser.add_argument('--benchmark-no-alloc', action='store_true', help='Skip tracemalloc allocation tracking in benchmark mode')
 args = parser.parse_args()
 
-if args.rotation is None:
-    # Mac, something like:
-    # port = '/dev/tty.ESP32Sun'
-    # PC 
-    # may not be COM6 depending on your system, must pair to device first
-    port = 'COM6'
+if args.benchmark:
+    # Headless, scripted and uncapped; the virtual clock keeps animations in step
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    bench = Benchmark(STATE_NAMES, STATE_TITLE, STATE_GAME_PLAY, STATE_GAME_OVER,
+                      track_allocations=not args.benchmark_no_alloc)
+    virtual_clock = bench.clock
+elif args.replay and args.replay_fast:
+    # Uncapped; the virtual clock keeps the replay in step with the frames
+    bench = None
+    virtual_clock = VirtualClock()
+else:
+    bench = None
+    virtual_clock = None
+get_ticks = virtual_clock.get_ticks if virtual_clock else pygame.time.get_ticks
+
+def open_serial(port):
     try:
         bt = serial.Serial(port=port, baudrate=115200, timeout=1)
         time.sleep(1)  # Let the connection settle
         print(f"Connected to Serial on {port}")
+        return bt
     except Exception as e:
         print(f"Skipping Serial connection: {e}")
-else:
-    bt = None
+        return None
+
+# Sensor samples land here, from the reader thread or the benchmark script
+sensors = bench.sensors if bench else SensorBuffer(3)
+sensor_reader = None
+replay = SensorReplay(args.replay, sensors) if args.replay else None
+recorder = SessionRecorder(args.record, 3) if args.record else None
+sensors.recorder = recorder
+
+def sensor_clock():
+    # The clock sample timestamps are on, in seconds: the serial reader
+    # stamps with time.perf_counter(), the benchmark and replay push samples on
+    # the game's (possibly virtual) clock. The recorder's timeline has to run
+    # on the same one.
+    if bench or replay:
+        return get_ticks() / 1000
+    return time.perf_counter()
 
 pygame.init()
 SCREEN_WIDTH = 1400
@@ -89,70 +256,128 @@ SCREEN_HEIGHT = 1000
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Sun Simulation")
 clock = pygame.time.Clock()
+text_cache = TextCache()
+# Composed on first use, then scrolled as one surface
+rising_crawl = TextCrawl(text_cache, RISING_TEXTS, 50, (255, 255, 255), LINE_SPACING)
+intro_camera = Camera((SCREEN_WIDTH, SCREEN_HEIGHT))
+compositor = Compositor(screen)
+glow_cache = GlowCache(radius=110, max_level=60)  # radius of the sun's opaque disc, max_level matches max_brighten below
+dirty = DirtyRects(screen, enabled=args.dirty_rects)
+profiler = FrameProfiler(STATE_NAMES, trace_path=args.trace)
+compositor.profiler = profiler
+state_capture = StateCapture(STATE_NAMES, output_dir=args.profile_dir,
+                             trigger={name: state for state, name in STATE_NAMES.items()}.get(args.profile_state))
+last_drawn_state = None
 print("Set up PyGame.")
-time.sleep(1)
 
 # load in sun images
 IMAGE_FOLDER = "sun-frames-background-removed"
 SUN_SIZE = 275
-try:
-    # Get a sorted list of filenames first
-    image_files = sorted([
-        f for f in os.listdir(IMAGE_FOLDER)
-        if f.endswith('.png')
-    ])
-
-    # Then load the images
-    sun_frames = [pygame.image.load(os.path.join(IMAGE_FOLDER, f)) for f in image_files]
-    sun_frames = [pygame.transform.smoothscale(img, (SUN_SIZE, SUN_SIZE)) for img in sun_frames]
-    print(f"Loaded in {len(sun_frames)} sun frames")
-
-    # Load Earth images
-    EARTH_DISPLAY_SIZE = 64  # Size for display
-    EARTH_LOAD_SIZE = 512    # Size to load at (higher resolution)
-    
-    # Load all earth stage images
-    earth_images = []
-    for i in range(1, 9):  # Load images 1.png through 8.png
-        img = pygame.image.load(f'earth_images/{i}.png')
-        # First scale to high resolution
-        img = pygame.transform.smoothscale(img, (EARTH_LOAD_SIZE, EARTH_LOAD_SIZE))
-        # Then create display version
-        display_img = pygame.transform.smoothscale(img, (EARTH_DISPLAY_SIZE, EARTH_DISPLAY_SIZE))
-        earth_images.append({
-            'high_res': img,
-            'display': display_img
-        })
-    print("Loaded Earth images")
-except Exception as e:
-    traceback.print_exc()
-    input("Failed to load images...")
-
-# Earth appearance states
-EARTH_STATES = {
-    0: earth_images[0],    # First stage
-    1: earth_images[1],    # Second stage
-    2: earth_images[2],    # Third stage
-    3: earth_images[3],    # Fourth stage
-    4: earth_images[4],    # Fifth stage
-    5: earth_images[5],    # Sixth stage
-    6: earth_images[6],    # Seventh stage
-    7: earth_images[7],    # Eighth stage
-}
+EARTH_DISPLAY_SIZE = 64  # Size for display
+EARTH_LOAD_SIZE = 512    # Size to load at (higher resolution)
+
+# Everything is loaded in the background so the title screen shows up right
+# away. Sun frames are needed first (end of the text crawl), Earth stages later.
+assets = AssetLoader()
+assets.submit('sun_frames', load_sun_frames, IMAGE_FOLDER, SUN_SIZE,
+              use_cache=not args.no_frame_cache, priority=0)
+for i in range(1, 9):  # Load images 1.png through 8.png
+    assets.submit(f'earth_{i}', load_earth_stage, f'earth_images/{i}.png',
+                  EARTH_LOAD_SIZE, EARTH_DISPLAY_SIZE, priority=1)
+assets.submit('glow', glow_cache.prepare, priority=1)
+if args.rotation is None and not bench and not replay:
+    assets.submit('serial', open_serial, args.port, priority=0)
+
+def wait_for_asset(name):
+    try:
+        return assets.get(name)
+    except Exception as e:
+        traceback.print_exc()
+        input("Failed to load images...")
+
+sun_frames = None
+
+def require_sun_frames():
+    # Only blocks if the frames are not ready yet
+    global sun_frames
+    if sun_frames is None:
+        sun_frames = wait_for_asset('sun_frames')
+        print(f"Loaded in {len(sun_frames)} sun frames")
+
+# Earth appearance states, filled in once the stage images are loaded
+EARTH_STATES = {}
+earth_cross_fade = StageCrossFade(EARTH_STATES)
+
+def require_earth_states():
+    if not EARTH_STATES:
+        for i in range(8):
+            EARTH_STATES[i] = wait_for_asset(f'earth_{i + 1}')
+        print("Loaded Earth images")
+        # Every transition's blends, before play gets to them
+        for i in range(len(EARTH_STATES)):
+            assets.submit(f'earth_fade_{i}', earth_cross_fade.prepare, i, priority=2)
+
+def require_serial():
+    global sensor_reader
+    if sensor_reader is None and not bench and not replay and args.rotation is None:
+        port = assets.get('serial')
+        if port is not None:
+            sensor_reader = SerialSensorReader(port, 3, sensors, protocol=args.protocol).start()
+
+def resume_sensor_session():
+    # Recording and replay time only runs during game play
+    if recorder:
+        recorder.resume(sensor_clock())
+    if replay:
+        replay.resume(get_ticks() / 1000)
+
+def pause_sensor_session(outcome):
+    global running
+    if recorder:
+        recorder.pause(sensor_clock())
+    if replay:
+        replay.pause(get_ticks() / 1000)
+        print(f"Replay run ended in {STATE_NAMES[outcome]}, {replay.position}/{len(replay.samples)} samples played")
+        if args.replay_fast and replay.finished:
+            running = False
+
 EARTH_STATE_DURATION = 15000  # Duration for each Earth in milliseconds (15 seconds)
 current_earth_state = 0
 earth_state_start_time = 0
 
-FPS = 60
+FPS = args.fps
 
 running = True
 frame_index = 0
+
+# Game logic runs in fixed ticks, however many frames get rendered
+timestep = FixedTimestep(SIM_RATE)
+# Full rate while animating, next to nothing on static screens
+scheduler = FrameScheduler(clock, FPS, virtual=virtual_clock is not None)
+sim_steps = 0  # ticks to run this frame
+
+def spin_sun(speed):
+    # Turns the sun by speed animation frames per tick, for this frame's
+    # ticks. Returns the frame to draw, in between the last two ticks.
+    global frame_index
+    frame_index += speed * sim_steps
+    return int(timestep.behind(frame_index, speed)) % len(sun_frames)
+
+# Smoothing for the sensor input, see filters.py
+rotation_filter = make_filter(args.filter)
+sample_timer = SampleTimer()
+drift_integrator = DriftIntegrator(frame_rate=SIM_RATE)
+
+def reset_sensor_filters(rotation, settled=False):
+    rotation_filter.reset(rotation, settled)
+    sample_timer.reset()
+
 if args.rotation is not None:
     rotation_speed = args.rotation
-    rotation_speed_history = deque([rotation_speed])
+    reset_sensor_filters(rotation_speed)
 else:
     rotation_speed = 0.2
-    rotation_speed_history = deque([rotation_speed])
+    reset_sensor_filters(rotation_speed)
 
 x_drift = 0
 y_drift = 0
@@ -176,6 +401,7 @@ DRIFT_SUPER_MAX = 50
 
 instability_counter = 0
 INSTABILITY_LIMIT = 100
+EXPLOSION_PREPARE_AT = INSTABILITY_LIMIT // 2  # re-cut the ready explosion from the current sun frame
 # game_over = False # Replaced by game_state
 current_game_state = STATE_TITLE # Initial game state
 
@@ -198,18 +424,18 @@ current_message = None
 
 def reset_rising_animation():
     global rising_start_time, rising_phase
-    rising_start_time = pygame.time.get_ticks()
+    rising_start_time = get_ticks()
     rising_phase = 0
 
 def reset_spinning_animation():
     global spinning_start_time, spinning_phase, frame_index
-    spinning_start_time = pygame.time.get_ticks()
+    spinning_start_time = get_ticks()
     spinning_phase = 0
     frame_index = 0  # Reset sun animation frame
 
 def reset_earth_intro_animation():
     global earth_intro_start_time, earth_intro_phase
-    earth_intro_start_time = pygame.time.get_ticks()
+    earth_intro_start_time = get_ticks()
     earth_intro_phase = 0
 
 def get_earth_appearance(current_time):
@@ -233,10 +459,6 @@ def get_earth_appearance(current_time):
             # Calculate transition progress (0 to 1)
             progress = transition_elapsed / EARTH_TRANSITION_DURATION
             
-            # Get current and next states
-            current_state = EARTH_STATES[current_earth_state]
-            next_state_index = (current_earth_state + 1) % len(EARTH_STATES)
-            
             # Check if this is the final transition
             if current_earth_state == len(EARTH_STATES) - 2 and transition_elapsed >= EARTH_TRANSITION_DURATION - 100:
                 # Wait 2 seconds before triggering final zoom
@@ -244,30 +466,8 @@ def get_earth_appearance(current_time):
                     game_state.current_state = STATE_FINAL_ZOOM
                     game_state.message_start_time = current_time
             
-            next_state = EARTH_STATES[next_state_index]
-            
-            # Create surfaces for blending
-            high_res_surface = pygame.Surface((EARTH_LOAD_SIZE, EARTH_LOAD_SIZE), pygame.SRCALPHA)
-            display_surface = pygame.Surface((EARTH_DISPLAY_SIZE, EARTH_DISPLAY_SIZE), pygame.SRCALPHA)
-            
-            # Draw current state with fading out alpha
-            current_alpha = int(255 * (1 - progress))
-            current_state['high_res'].set_alpha(current_alpha)
-            current_state['display'].set_alpha(current_alpha)
-            high_res_surface.blit(current_state['high_res'], (0, 0))
-            display_surface.blit(current_state['display'], (0, 0))
-            
-            # Draw next state with fading in alpha
-            next_alpha = int(255 * progress)
-            next_state['high_res'].set_alpha(next_alpha)
-            next_state['display'].set_alpha(next_alpha)
-            high_res_surface.blit(next_state['high_res'], (0, 0))
-            display_surface.blit(next_state['display'], (0, 0))
-            
-            return {
-                'high_res': high_res_surface,
-                'display': display_surface
-            }
+            # Cached blend step between the current and next stage
+            return earth_cross_fade.frame(current_earth_state, progress)
         else:
             # Transition complete, move to next state
             current_earth_state = (current_earth_state + 1) % len(EARTH_STATES)
@@ -286,18 +486,6 @@ reset_rising_animation()
 # Add this to the game initialization section
 earth_transition_start = 0
 
-def read_arduino_sensor_data(bt, num_parts):
-    if bt and bt.in_waiting > 0:
-        line = bt.readline().decode('utf-8', errors='ignore').strip()
-        if line:
-            parts = line.split()
-            if len(parts) == num_parts:
-                try:
-                    return [float(x) for x in parts]
-                except ValueError:
-                    print(f"Malformed float in line: {line}")
-    return [float(0) for _ in range(num_parts)]
-
 def get_earth_pos(angle, tilt_deg=orbit_tilt_degree, distance=orbit_distance):
     # Convert tilt to radians
     tilt = math.radians(tilt_deg)
@@ -311,18 +499,57 @@ def get_earth_pos(angle, tilt_deg=orbit_tilt_degree, distance=orbit_distance):
     return (ORBIT_CENTER[0] + x_tilt, ORBIT_CENTER[1] + y_tilt + distance)
 
 # Initialize game state
-game_state = GameState()
+quality = QualityGovernor(1000 / FPS, 'full' if virtual_clock and args.quality == 'auto' else args.quality)
+game_state = GameState(args.explosion, quality)
 current_game_state = STATE_TITLE  # For compatibility with existing code
 message_start_time = 0
 current_message = None
 
+if bench:
+    # Measure rendering, not loading
+    require_sun_frames()
+    require_earth_states()
+    assets.get('glow')
+
 while running:
-    events = pygame.event.get() # Get events once per frame
-    current_time = pygame.time.get_ticks()
+    if bench:
+        bench.frame(game_state.current_state)
+        if bench.done:
+            break
+    elif virtual_clock:
+        virtual_clock.advance()
+        # Play through on our own, until the recording runs out. Each screen is
+        # shown for a frame first so runs are reported separately.
+        if not replay.finished and game_state.current_state == last_drawn_state:
+            if game_state.current_state == STATE_TITLE:
+                pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+            elif game_state.current_state == STATE_GAME_OVER:
+                pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_r))
+    profiler.begin_frame(game_state.current_state)
+    state_capture.frame()
+    if profiler.recent:
+        quality.frame(profiler.recent[-1])
+    events = scheduler.events() # Get events once per frame
+    current_time = get_ticks()
+    if scheduler.idled:
+        timestep.reset()  # nothing was simulated while idle, don't catch up on it
+    sim_steps = timestep.advance(current_time)
+    idle = False  # set by static scenes
+    profiler.lap('event pump')
     
     for event in events:
         if event.type == pygame.QUIT:
             running = False
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            profiler.toggle_overlay()
+            continue
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+            # Capture until the state changes, or stop a capture early
+            if state_capture.active:
+                state_capture.stop()
+            else:
+                state_capture.start(game_state.current_state)
+            continue
         
         # Handle state-specific KEYDOWN events for transitions or actions
         if game_state.current_state == STATE_TITLE:
@@ -341,10 +568,10 @@ while running:
                 frame_index = 0
                 if args.rotation is not None:
                     rotation_speed = args.rotation
-                    rotation_speed_history = deque([rotation_speed])
+                    reset_sensor_filters(rotation_speed)
                 else:
                     rotation_speed = 0.2
-                    rotation_speed_history = deque([rotation_speed])
+                    reset_sensor_filters(rotation_speed)
                 x_drift = 0
                 y_drift = 0
                 current_earth_state = 0
@@ -363,10 +590,10 @@ while running:
                 frame_index = 0
                 if args.rotation is not None:
                     rotation_speed = args.rotation
-                    rotation_speed_history = deque([rotation_speed])
+                    reset_sensor_filters(rotation_speed)
                 else:
                     rotation_speed = 0.2
-                    rotation_speed_history = deque([rotation_speed])
+                    reset_sensor_filters(rotation_speed)
                 x_drift = 0
                 y_drift = 0
                 current_earth_state = 0
@@ -380,24 +607,49 @@ while running:
                 game_state.reset_explosion()
                 displayed_year = 0
 
-    screen.fill((0, 0, 0)) # Clear screen once at the beginning of the loop
-
-    if game_state.current_state == STATE_TITLE:
-        # Only show title screen elements, no game objects
-        screen.fill((0, 0, 0))  # Clear screen with black
-        font = pygame.font.SysFont(None, 100)
-        title_text = font.render("HELIOS", True, (255, 255, 255))
-        screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, SCREEN_HEIGHT // 2 - 100))
-        font_small = pygame.font.SysFont(None, 36)
-        prompt_text = font_small.render("Press any key to start", True, (200, 200, 200))
-        screen.blit(prompt_text, (SCREEN_WIDTH // 2 - prompt_text.get_width() // 2, SCREEN_HEIGHT // 2))
-        pygame.display.flip()  # Update the display
-        continue  # Skip the rest of the loop to avoid drawing game objects
+    # Redraw everything after a state change, otherwise only what changed
+    if game_state.current_state != last_drawn_state:
+        dirty.invalidate()
+        if game_state.current_state == STATE_GAME_PLAY:
+            resume_sensor_session()
+        elif last_drawn_state == STATE_GAME_PLAY:
+            pause_sensor_session(game_state.current_state)
+        last_drawn_state = game_state.current_state
+        state_capture.state_changed(game_state.current_state)
+        sensors.since_last()  # drop samples that piled up while another state was running
+
+    # Keep an explosion ready for the next game over, from the first sun frame
+    # until play gets unstable enough to re-cut it from the current one
+    game_state.collect_explosion(assets)
+    if (game_state.current_state != STATE_GAME_OVER and game_state.prepared_explosion is None
+            and game_state.explosion_job is None and not game_state.explosion_failed
+            and assets.ready('sun_frames')):
+        require_sun_frames()
+        game_state.prepare_explosion(assets, sun_frames[0])
+    profiler.lap('events')
+
+    dirty.clear() # Clear screen once at the beginning of the loop
+    profiler.lap('clear')
 
     # Update current_game_state for compatibility with existing code
     current_game_state = game_state.current_state
 
-    if game_state.current_state == STATE_SUN_RISING:
+    if game_state.current_state == STATE_TITLE:
+        # Only show title screen elements, no game objects
+        dirty.add(text_cache.draw(screen, "HELIOS", 100, (255, 255, 255), midtop=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100)))
+        dirty.add(text_cache.draw(screen, "Press any key to start", 36, (200, 200, 200), midtop=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
+        # Loading progress, disappears once everything is in memory
+        load_progress = assets.progress()
+        if load_progress < 1:
+            bar_width = 300
+            bar_x = (SCREEN_WIDTH - bar_width) // 2
+            bar_y = SCREEN_HEIGHT // 2 + 60
+            dirty.add(pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, bar_width, 6)))
+            pygame.draw.rect(screen, (200, 200, 200), (bar_x, bar_y, int(bar_width * load_progress), 6))
+        profiler.lap('text')
+        idle = True  # only the loading bar moves
+
+    elif game_state.current_state == STATE_SUN_RISING:
         elapsed = current_time - rising_start_time
         
         if rising_phase == 0:  # Text rising phase
@@ -405,56 +657,23 @@ while running:
                 # Calculate text position (move from bottom to top)
                 progress = elapsed / RISING_TEXT_DURATION
                 
-                font = pygame.font.SysFont(None, 50)
-                texts = [
-                    "Since ancient times, cultures around the world have had Sun gods.",
-                    "Apollo. Ra. Sol Invictus. Helios.",
-                    "And now you. ",
-                    "",
-                    "",
-                    "Imagine you now hold the power of the Sun",
-                    "in the palm of your hand—because you do.",
-                    "",
-                    "",
-                    "A flick of your wrist",
-                    "and all life on Earth is gone,",
-                    "along with the rest of the solar system,",
-                    "in a single flash of sunlight.",
-                    "",
-                    "",
-                    "The power of a billions of ",
-                    "thermonuclear bombs every single second,",
-                    "and stability relies on you.",
-                    "",
-                    "",
-                    "Keep the Sun spinning and stable. ",
-                    "Or don't. ",
-                    "You're the sun god. "
-                ]
-                
-                # Calculate total height needed for all text
-                LINE_SPACING = 60
-                total_text_height = len(texts) * LINE_SPACING
                 # Add extra padding to ensure all text moves off screen
-                total_distance = SCREEN_HEIGHT + total_text_height + 100  # 100px extra padding
+                total_distance = SCREEN_HEIGHT + rising_crawl.height + 100  # 100px extra padding
                 
                 # Calculate starting Y position that will allow all text to be visible
                 start_y = SCREEN_HEIGHT + LINE_SPACING
                 # Calculate current Y position
                 text_y = start_y - (progress * total_distance)
                 
-                # Draw each line of text with spacing
-                for i, line in enumerate(texts):
-                    text_surface = font.render(line, True, (255, 255, 255))
-                    text_rect = text_surface.get_rect(center=(SCREEN_WIDTH/2, text_y + i*LINE_SPACING))
-                    # Only draw text if it's in or near the visible area
-                    if -100 <= text_rect.bottom <= SCREEN_HEIGHT + 100:
-                        screen.blit(text_surface, text_rect)
+                # Blit just the visible window of the pre-composed crawl
+                dirty.add(rising_crawl.draw(screen, SCREEN_WIDTH / 2, text_y))
+                profiler.lap('text')
             else:
                 rising_phase = 1
                 rising_start_time = current_time  # Reset timer for sun rising phase
         
         elif rising_phase == 1:  # Combined sun rising and spinning phase
+            require_sun_frames()
             if elapsed < RISING_SUN_DURATION:
                 progress = elapsed / RISING_SUN_DURATION
 
@@ -467,33 +686,31 @@ while running:
                 current_spin_speed = min(TARGET_SPIN_SPEED, max(TARGET_SPIN_SPEED * progress, 0.25))
             
                 # Update frame index for spinning
-                frame_index += current_spin_speed
-                frame_base = int(frame_index) % len(sun_frames)
+                frame_base = spin_sun(current_spin_speed)
                 
                 # Draw the sun at its current position
-                frame_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
                 x_offset = (SCREEN_WIDTH - SUN_SIZE) // 2
                 y_offset = int(sun_y - SUN_SIZE//2)
-                frame_surface.blit(sun_frames[frame_base], (x_offset, y_offset))
-                screen.blit(frame_surface, (0, 0))
+                compositor.add(LAYER_SUN, sun_frames[frame_base], (x_offset, y_offset))
+                dirty.add_all(compositor.render())
             else:
                 # Brief pause at full spin
                 if elapsed < RISING_SUN_DURATION + FINAL_RISING_PAUSE:
-                    frame_index += TARGET_SPIN_SPEED
-                    frame_base = int(frame_index) % len(sun_frames)
+                    frame_base = spin_sun(TARGET_SPIN_SPEED)
                     
                     # Draw the sun at center
-                    frame_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
                     x_offset = (SCREEN_WIDTH - SUN_SIZE) // 2
                     y_offset = (SCREEN_HEIGHT - SUN_SIZE) // 2
-                    frame_surface.blit(sun_frames[frame_base], (x_offset, y_offset))
-                    screen.blit(frame_surface, (0, 0))
+                    compositor.add(LAYER_SUN, sun_frames[frame_base], (x_offset, y_offset))
+                    dirty.add_all(compositor.render())
                 else:
                     # Transition directly to Earth intro
                     game_state.current_state = STATE_EARTH_INTRO
                     reset_earth_intro_animation()
 
     elif game_state.current_state == STATE_EARTH_INTRO:
+        require_sun_frames()
+        require_earth_states()
         elapsed = current_time - earth_intro_start_time
         
         # Start Earth at -45 degrees (closer to center) instead of 0 degrees (far right of orbit)
@@ -510,13 +727,11 @@ while running:
         START_CENTER_X = SCREEN_WIDTH / 2
         START_CENTER_Y = SCREEN_HEIGHT / 2
         
-        # Draw base scene with sun (always in the same position as spinning stage)
-        frame_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        x_offset = (SCREEN_WIDTH - SUN_SIZE) // 2
-        y_offset = (SCREEN_HEIGHT - SUN_SIZE) // 2
-        frame_index += TARGET_SPIN_SPEED
-        frame_base = int(frame_index) % len(sun_frames)
-        frame_surface.blit(sun_frames[frame_base], (x_offset, y_offset))
+        # Sun sits in the same position as in the spinning stage
+        sun_center = ((SCREEN_WIDTH - SUN_SIZE) // 2 + SUN_SIZE / 2, (SCREEN_HEIGHT - SUN_SIZE) // 2 + SUN_SIZE / 2)
+        frame_base = spin_sun(TARGET_SPIN_SPEED)
+        # Earth sprite for this frame, if any
+        intro_earth = None
         
         if earth_intro_phase == 0:  # Zooming in phase
             if elapsed < ZOOM_IN_DURATION:
@@ -554,16 +769,13 @@ while running:
                 zoomed_size = int(EARTH_DISPLAY_SIZE * zoom_scale)
                 
                 # Draw Earth with fade effect at its orbital position using high-res version
-                earth_surface = pygame.Surface((EARTH_LOAD_SIZE, EARTH_LOAD_SIZE), pygame.SRCALPHA)
-                # Create a copy of the high-res earth image and set its alpha
-                temp_earth = get_earth_appearance(current_time)['high_res'].copy()
-                temp_earth.set_alpha(alpha)
-                earth_surface.blit(temp_earth, (0, 0))
-                
-                # Scale from high-res to zoomed size (maintaining quality)
-                scaled_earth = pygame.transform.smoothscale(earth_surface, (zoomed_size, zoomed_size))
-                earth_rect = scaled_earth.get_rect(center=earth_orbital_pos)
-                frame_surface.blit(scaled_earth, earth_rect)
+                intro_earth = {
+                    'image': get_earth_appearance(current_time)['mips'],
+                    'pos': earth_orbital_pos,
+                    'size': (zoomed_size, zoomed_size),
+                    'alpha': alpha,
+                    'behind': False
+                }
                 
                 view_offset_x = (FINAL_ZOOM_CENTER_X - SCREEN_WIDTH/2)
                 view_offset_y = (FINAL_ZOOM_CENTER_Y - SCREEN_HEIGHT/2)
@@ -585,26 +797,15 @@ while running:
                 current_earth_pos = get_earth_pos(current_angle)
 
                 zoomed_size = int(EARTH_DISPLAY_SIZE * zoom_scale)
-                # Create scaled earth from high-res version
-                scaled_earth = pygame.transform.smoothscale(get_earth_appearance(current_time)['high_res'], (zoomed_size, zoomed_size))
-                
                 # Check if Earth is behind sun for proper z-ordering
                 earth_behind = current_earth_pos[1] < ORBIT_CENTER[1]
-                
-                # Draw Earth behind sun if needed
-                if earth_behind:
-                    earth_rect = scaled_earth.get_rect()
-                    earth_rect.center = (int(current_earth_pos[0]), int(current_earth_pos[1]))
-                    frame_surface.blit(scaled_earth, earth_rect)
-                
-                # Draw sun
-                frame_surface.blit(sun_frames[frame_base], (x_offset, y_offset))
-                
-                # Draw Earth in front if needed
-                if not earth_behind:
-                    earth_rect = scaled_earth.get_rect()
-                    earth_rect.center = (int(current_earth_pos[0]), int(current_earth_pos[1]))
-                    screen.blit(scaled_earth, earth_rect)
+                intro_earth = {
+                    'image': get_earth_appearance(current_time)['mips'],
+                    'pos': (int(current_earth_pos[0]), int(current_earth_pos[1])),
+                    'size': (zoomed_size, zoomed_size),
+                    'alpha': 255,
+                    'behind': earth_behind
+                }
                 
                 # Calculate view offset with transition back to center
                 # Follow Earth's movement partially during first half of zoom out
@@ -624,50 +825,54 @@ while running:
                 earth_angle = current_angle  # Start gameplay at the final animation angle
                 # Calculate initial movement speed based on the animation's final velocity
                 # This helps match the gameplay movement to the animation end state
-                EARTH_ORBIT_SPEED = (ORBIT_MOVEMENT_AMOUNT / ZOOM_OUT_DURATION) * 16.67  # Convert to per-frame speed
+                EARTH_ORBIT_SPEED = (ORBIT_MOVEMENT_AMOUNT / ZOOM_OUT_DURATION) * timestep.step_ms  # Convert to per-tick speed
                 # Initialize rotation speed to match the animation
                 if args.rotation is None:
                     rotation_speed = TARGET_SPIN_SPEED
-                    rotation_speed_history = deque([rotation_speed] * 10)  # Fill history with current speed
+                    reset_sensor_filters(rotation_speed, settled=True)  # As if it had been spinning at this speed
                 game_state.current_state = STATE_GAME_PLAY
                 game_state.message_start_time = current_time
                 game_state.current_message = EARTH_MESSAGES[0]
                 # Don't reset frame_index here - let it continue from current value
         
-        # Scale and position the view (consistent across all phases)
-        scaled_surface = pygame.transform.scale(
-            frame_surface,
-            (int(SCREEN_WIDTH * zoom_scale), int(SCREEN_HEIGHT * zoom_scale))
-        )
-        screen.blit(
-            scaled_surface,
-            (-view_offset_x * zoom_scale - (SCREEN_WIDTH * (zoom_scale - 1))/2,
-             -view_offset_y * zoom_scale - (SCREEN_HEIGHT * (zoom_scale - 1))/2)
-        )
+        # Point the camera (consistent across all phases) and draw only what it sees,
+        # each sprite scaled once straight to its on-screen size
+        intro_camera.center = (SCREEN_WIDTH/2 + view_offset_x, SCREEN_HEIGHT/2 + view_offset_y)
+        intro_camera.zoom = zoom_scale
+        smooth_earth = quality.settings['smooth']
+        if intro_earth and intro_earth['behind']:
+            dirty.add(intro_camera.draw(screen, intro_earth['image'], intro_earth['pos'], intro_earth['size'],
+                                        smooth=smooth_earth, alpha=intro_earth['alpha']))
+        dirty.add(intro_camera.draw(screen, sun_frames[frame_base], sun_center))
+        if intro_earth and not intro_earth['behind']:
+            dirty.add(intro_camera.draw(screen, intro_earth['image'], intro_earth['pos'], intro_earth['size'],
+                                        smooth=smooth_earth, alpha=intro_earth['alpha']))
 
     elif game_state.current_state == STATE_GAME_PLAY:
+        require_serial()
         # --- Existing Game Logic ---
         if args.rotation is not None:
             # Use constant rotation speed, no Arduino
-            frame_index += rotation_speed  # Make sure we're still updating frame_index
+            frame_index += rotation_speed * sim_steps  # Make sure we're still updating frame_index
             pass  # rotation_speed is already set, no drift
         else:
-            sensor_data = read_arduino_sensor_data(bt, 3)
-            sensor_rotation = sensor_data[2] / 2500
-            sensor_drift_x = sensor_data[0] / 2000
-            sensor_drift_y = sensor_data[1] / 2000
-
-            # LIVE ROTATION CHANGING
-            rotation_speed_history.append(sensor_rotation)
-            if len(rotation_speed_history) > 10:
-                rotation_speed_history.popleft()
-            rotation_speed = sum(rotation_speed_history) / len(rotation_speed_history)
-
-            # LIVE TILT SHIFTING
-            dx = sensor_drift_x
-            dy = sensor_drift_y
-            x_drift += dx - (x_drift / 100)
-            y_drift += dy - (y_drift / 100)
+            if replay:
+                replay.update(current_time / 1000)
+                if args.replay_fast and replay.time_past_end(current_time / 1000) > 1.0:
+                    print("Recording ended during game play")
+                    running = False
+            # Every sample that came in since the last frame, as one block
+            sample_times, sensor_data = sensors.since_last_block()
+            if len(sample_times):
+                dts = sample_timer.steps(sample_times)
+
+                # LIVE ROTATION CHANGING
+                rotation_speed = rotation_filter.update_block(sensor_data[:, 2] / 2500, dts)
+
+                # LIVE TILT SHIFTING, over the time the samples cover
+                x_drift, y_drift = drift_integrator.integrate(
+                    (x_drift, y_drift), sensor_data[:, :2] / 2000, dts).tolist()
+            profiler.lap('sensors')
 
             # Have tilt influence the orbit
             orbit_tilt_degree = max(-45, min(45, 0.1 * x_drift))
@@ -681,16 +886,20 @@ while running:
         )
 
         if unstable:
-            instability_counter += 1
+            instability_counter += sim_steps
         else:
-            instability_counter = max(0, instability_counter - 1)
+            instability_counter = max(0, instability_counter - sim_steps)
 
         if instability_counter > INSTABILITY_LIMIT or abs(x_drift) > DRIFT_SUPER_MAX or abs(y_drift) > DRIFT_SUPER_MAX:
             game_state.current_state = STATE_GAME_OVER
+        elif instability_counter >= EXPLOSION_PREPARE_AT and not game_state.explosion_refreshed:
+            # Heading for game over: have the explosion look like the sun does now
+            game_state.prepare_explosion(assets, sun_frames[int(frame_index) % len(sun_frames)])
+            game_state.explosion_refreshed = True
 
         # --- Earth Orbit ---
         prev_earth_angle = earth_angle  # Store previous angle
-        earth_angle -= EARTH_ORBIT_SPEED # + (0.01 if unstable else 0)
+        earth_angle -= EARTH_ORBIT_SPEED * sim_steps # + (0.01 if unstable else 0)
         delta_angle = prev_earth_angle - earth_angle
         if delta_angle < 0:
             delta_angle += 2 * math.pi
@@ -698,29 +907,26 @@ while running:
         if earth_angle < 0:
             earth_angle += 2 * math.pi
 
-        # Draw base scene
-        frame_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-
-        # Calculate Earth position and z-order
-        earth_pos = get_earth_pos(earth_angle, orbit_tilt_degree, orbit_distance)
+        # Calculate Earth position and z-order, in between the last two ticks
+        earth_pos = get_earth_pos(timestep.behind(earth_angle, -EARTH_ORBIT_SPEED), orbit_tilt_degree, orbit_distance)
         earth_behind = earth_pos[1] < ORBIT_CENTER[1]
 
         # Get current Earth appearance
         earth_display_img = get_earth_appearance(current_time)['display']
 
-        # Draw Earth behind sun if needed
-        if earth_behind:
-            earth_rect = earth_display_img.get_rect()
-            earth_rect.center = (int(earth_pos[0]), int(earth_pos[1]))
-            frame_surface.blit(earth_display_img, earth_rect)
+        # Earth goes behind or in front of the sun depending on where it is in its orbit
+        earth_rect = earth_display_img.get_rect()
+        earth_rect.center = (int(earth_pos[0]), int(earth_pos[1]))
+        compositor.add(LAYER_BACKGROUND_EARTH if earth_behind else LAYER_FOREGROUND_EARTH,
+                       earth_display_img, earth_rect)
 
         # Draw sun
         x_offset = ((SCREEN_WIDTH - SUN_SIZE) // 2) + x_drift
         y_offset = ((SCREEN_HEIGHT - SUN_SIZE) // 2) + y_drift
-        frame_base = int(frame_index) % len(sun_frames)
+        frame_base = spin_sun(rotation_speed)
         frame_next = (frame_base + 1) % len(sun_frames)
         next_img = sun_frames[frame_next]
-        frame_surface.blit(next_img, (x_offset, y_offset))
+        compositor.add(LAYER_SUN, next_img, (x_offset, y_offset))
         
         # brightness = rotation_speed + instability between 0 and 1
         brightness = ((rotation_speed - ROTATION_MIN) / (ROTATION_MAX - ROTATION_MIN)) / 2  + \
@@ -730,27 +936,12 @@ while running:
         max_brighten = 60
         brighten = int(brightness * max_brighten)
 
-        if brighten > 0:
-            circle_overlay = pygame.Surface((SUN_SIZE, SUN_SIZE))
-            circle_overlay.set_colorkey((0, 0, 0))  # Make black transparent
-            pygame.draw.circle(
-                circle_overlay,
-                (brighten, brighten, brighten),  # Pure white, but low value for subtlety
-                (SUN_SIZE // 2, SUN_SIZE // 2),
-                110
-            )
-            frame_surface.blit(circle_overlay, (x_offset, y_offset), special_flags=pygame.BLEND_RGB_ADD)
-
-        # Blit the combined frame to the screen
-        screen.blit(frame_surface, (0, 0))
+        if brighten > 0 and quality.settings['glow']:
+            sun_center = (x_offset + SUN_SIZE // 2, y_offset + SUN_SIZE // 2)
+            compositor.add(LAYER_GLOW, glow_cache.overlay(brighten), glow_cache.draw_position(sun_center),
+                           special_flags=pygame.BLEND_RGB_ADD)
 
-        # Draw Earth in front if needed (drawn on screen)
-        if not earth_behind:
-            earth_rect = earth_display_img.get_rect()
-            earth_rect.center = (int(earth_pos[0]), int(earth_pos[1]))
-            screen.blit(earth_display_img, earth_rect)
-
-        font_ingame = pygame.font.SysFont(None, 40) # Renamed to avoid conflict
+        profiler.lap('simulation')
 
         # Draw instability bar
         bar_width = 400
@@ -759,7 +950,7 @@ while running:
         bar_y = SCREEN_HEIGHT - bar_height - 20  # 20 pixels from bottom
         
         # Draw bar background (empty bar)
-        pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, bar_width, bar_height))
+        dirty.add(pygame.draw.rect(screen, (50, 50, 50), (bar_x, bar_y, bar_width, bar_height)))
         
         # Draw filled portion of bar
         fill_width = int((instability_counter / INSTABILITY_LIMIT) * bar_width)
@@ -768,6 +959,7 @@ while running:
         
         # Draw border around bar
         pygame.draw.rect(screen, (255, 255, 255), (bar_x, bar_y, bar_width, bar_height), 2)
+        profiler.lap('instability bar')
 
         # Draw phase message if active
         if game_state.current_message is not None:
@@ -778,21 +970,16 @@ while running:
                 if message_elapsed > MESSAGE_DISPLAY_DURATION - 500:
                     alpha = int(255 * (1 - (message_elapsed - (MESSAGE_DISPLAY_DURATION - 500)) / 500))
                 
-                font_message = pygame.font.SysFont(None, 36)
-                message_surface = font_message.render(game_state.current_message, True, (255, 255, 255))
-                message_surface.set_alpha(alpha)
-                message_x = (SCREEN_WIDTH - message_surface.get_width()) // 2
                 message_y = SCREEN_HEIGHT - bar_height - 60  # Position above the instability bar
-                screen.blit(message_surface, (message_x, message_y))
+                message_surface = text_cache.render(game_state.current_message, 36, (255, 255, 255))
+                compositor.add(LAYER_HUD, message_surface,
+                               message_surface.get_rect(midtop=(SCREEN_WIDTH // 2, message_y)), alpha=alpha)
             else:
                 game_state.current_message = None
+        profiler.lap('text')
 
-        if args.rotation is None: # This check needs to be inside GAME_PLAY state
-            bt.reset_input_buffer()
-            bt.reset_output_buffer()
-
-        # if not game_over: # This check is implicitly handled by current_game_state == STATE_GAME_PLAY
-        frame_index += rotation_speed
+        # Earth, sun, glow and message in layer order, straight onto the screen
+        dirty.add_all(compositor.render())
 
 
     elif game_state.current_state == STATE_GAME_OVER:
@@ -804,21 +991,23 @@ while running:
             game_state.start_explosion(
                 SCREEN_WIDTH // 2 + x_drift, 
                 SCREEN_HEIGHT // 2 + y_drift,
-                current_frame
+                current_frame,
+                wait_for=assets if virtual_clock else None
             )
+            profiler.lap('explosion start')
         
         # Update and draw explosion
-        if game_state.explosion and game_state.explosion.update():
-            game_state.explosion.draw(screen)
+        if game_state.explosion and game_state.explosion.update(sim_steps):
+            profiler.lap('simulation')
+            dirty.add_all(game_state.explosion.draw(screen, timestep.alpha))
+            profiler.lap('explosion')
+        else:
+            idle = True  # the explosion is over, just the text is left
         
         # Draw game over text
-        font = pygame.font.SysFont(None, 120)
-        text = font.render("GAME OVER", True, (255, 0, 0))
-        screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, SCREEN_HEIGHT // 2 - 40))
-
-        font3 = pygame.font.SysFont(None, 36)
-        restart_text = font3.render("Press R to Restart", True, (255, 255, 0))
-        screen.blit(restart_text, (SCREEN_WIDTH // 2 - restart_text.get_width() // 2, SCREEN_HEIGHT // 2 + 100))
+        dirty.add(text_cache.draw(screen, "GAME OVER", 120, (255, 0, 0), midtop=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 40)))
+        dirty.add(text_cache.draw(screen, "Press R to Restart", 36, (255, 255, 0), midtop=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100)))
+        profiler.lap('text')
 
     elif game_state.current_state == STATE_FINAL_ZOOM:
         elapsed = current_time - game_state.message_start_time
@@ -827,24 +1016,19 @@ while running:
         if elapsed < FADE_DURATION:
             # Continue Earth's orbital movement
             prev_earth_angle = earth_angle
-            earth_angle -= EARTH_ORBIT_SPEED
+            earth_angle -= EARTH_ORBIT_SPEED * sim_steps
             if earth_angle < 0:
                 earth_angle += 2 * math.pi
                 
-            # Continue sun's rotation
-            frame_index += rotation_speed
-            
             # Draw the final game state
-            frame_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            
-            # Draw sun
+            # Draw sun, still rotating
             x_offset = ((SCREEN_WIDTH - SUN_SIZE) // 2) + x_drift
             y_offset = ((SCREEN_HEIGHT - SUN_SIZE) // 2) + y_drift
-            frame_base = int(frame_index) % len(sun_frames)
-            frame_surface.blit(sun_frames[frame_base], (x_offset, y_offset))
+            frame_base = spin_sun(rotation_speed)
+            compositor.add(LAYER_SUN, sun_frames[frame_base], (x_offset, y_offset))
             
             # Calculate Earth position
-            earth_pos = get_earth_pos(earth_angle, orbit_tilt_degree, orbit_distance)
+            earth_pos = get_earth_pos(timestep.behind(earth_angle, -EARTH_ORBIT_SPEED), orbit_tilt_degree, orbit_distance)
             
             # Draw Earth
             earth_img = get_earth_appearance(current_time)['display']
@@ -855,23 +1039,20 @@ while running:
             fade_progress = elapsed / FADE_DURATION
             alpha = int(255 * (1 - fade_progress))
             
-            # Apply alpha to frame surface
-            frame_surface.set_alpha(alpha)
-            screen.blit(frame_surface, (0, 0))
-            
-            # Apply alpha to Earth
-            earth_img.set_alpha(alpha)
-            screen.blit(earth_img, earth_rect)
+            # Sun and Earth fade out together as one group, through the
+            # compositor's scratch buffer
+            compositor.add(LAYER_FOREGROUND_EARTH, earth_img, earth_rect)
+            dirty.add_all(compositor.render(alpha))
             
         else:
             # Reset game variables for new game
             frame_index = 0
             if args.rotation is not None:
                 rotation_speed = args.rotation
-                rotation_speed_history = deque([rotation_speed])
+                reset_sensor_filters(rotation_speed)
             else:
                 rotation_speed = 0.2
-                rotation_speed_history = deque([rotation_speed])
+                reset_sensor_filters(rotation_speed)
             x_drift = 0
             y_drift = 0
             current_earth_state = 0
@@ -886,7 +1067,22 @@ while running:
             game_state.reset_explosion()
             game_state.current_message = None
 
-    pygame.display.flip()
-    clock.tick(FPS)
-
+    profiler.lap('draw')
+    dirty.add(profiler.draw_overlay(screen))
+    profiler.lap('overlay')
+    dirty.present()
+    profiler.lap('present')
+    scheduler.wait(idle)
+    profiler.lap('tick')
+
+if bench:
+    bench.write_report(args.benchmark)
+profiler.write_trace()
+if state_capture.active:
+    state_capture.stop()
+
+if sensor_reader is not None:
+    sensor_reader.stop()
+if recorder:
+    recorder.close()
 pygame.quit()
@@ -0,0 +1,96 @@
+# font and rendered-text caching
+#
+# SysFont lookups and font.render are far more expensive than a blit, so the
+# game keeps one font object per (face, size) and an LRU of rendered strings.
+
+from collections import OrderedDict
+
+import pygame
+
+
+class TextCache:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._fonts = {}
+        self._rendered = OrderedDict()
+
+    def font(self, size, face=None):
+        key = (face, size)
+        font = self._fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(face, size)
+            self._fonts[key] = font
+        return font
+
+    def render(self, text, size, color, face=None):
+        # Cached surfaces are shared, treat them as read-only
+        key = (text, size, tuple(color), face)
+        surface = self._rendered.get(key)
+        if surface is not None:
+            self._rendered.move_to_end(key)
+            return surface
+        surface = self.font(size, face).render(text, True, color)
+        self._rendered[key] = surface
+        if len(self._rendered) > self.max_entries:
+            self._rendered.popitem(last=False)
+        return surface
+
+    def draw(self, target, text, size, color, face=None, **position):
+        # Renders (or reuses) text and blits it positioned like get_rect, e.g.
+        # draw(screen, "HELIOS", 100, WHITE, center=(x, y)). To fade cached
+        # text, blit it through compositor.FadeBuffer rather than setting its
+        # alpha.
+        surface = self.render(text, size, color, face)
+        return target.blit(surface, surface.get_rect(**position))
+
+    def clear(self):
+        self._rendered.clear()
+
+
+class TextCrawl:
+    # A block of centred lines composed once into a single tall surface.
+    # Each frame only the part that overlaps the target is blitted, so the
+    # cost no longer depends on how many lines the script has.
+    def __init__(self, text_cache, lines, size, color, line_spacing, face=None):
+        self.text_cache = text_cache
+        self.lines = lines
+        self.size = size
+        self.color = color
+        self.line_spacing = line_spacing
+        self.face = face
+        self._surface = None
+
+    @property
+    def surface(self):
+        if self._surface is None:
+            self._surface = self._compose()
+        return self._surface
+
+    @property
+    def height(self):
+        return len(self.lines) * self.line_spacing
+
+    def _compose(self):
+        # Render straight from the font so the one-off crawl lines do not
+        # push the frequently used strings out of the LRU
+        font = self.text_cache.font(self.size, self.face)
+        rendered = [font.render(line, True, self.color) for line in self.lines]
+        width = max([r.get_width() for r in rendered] + [1])
+        surface = pygame.Surface((width, self.height), pygame.SRCALPHA)
+        for i, line_surface in enumerate(rendered):
+            # line i is centred on i * line_spacing + line_spacing / 2
+            rect = line_surface.get_rect(center=(width / 2, i * self.line_spacing + self.line_spacing / 2))
+            surface.blit(line_surface, rect)
+        return surface
+
+    def draw(self, target, center_x, first_line_y):
+        # first_line_y is where the centre of the first line should land
+        surface = self.surface
+        top = int(first_line_y - self.line_spacing / 2)
+        left = int(center_x - surface.get_width() / 2)
+        src_top = max(0, -top)
+        visible = min(surface.get_height() - src_top, target.get_height() - max(top, 0))
+        if visible <= 0:
+            return pygame.Rect(left, max(top, 0), 0, 0)
+        area = pygame.Rect(0, src_top, surface.get_width(), visible)
+        return target.blit(surface, (left, max(top, 0)), area)
@@ -0,0 +1,42 @@
+# fixed-timestep simulation
+#
+# The game's rules are written per 1/60 s tick: sun and orbit steps, the
+# instability counter, particle motion. FixedTimestep turns the real time
+# that passed into a whole number of ticks to simulate this frame and
+# carries the remainder over, so the game plays the same whether it renders
+# at 30, 60 or 144 frames per second, and a slow frame only costs
+# smoothness. alpha is how far the rendered frame is past the last tick,
+# for drawing in between ticks.
+
+SIM_RATE = 60  # ticks per second
+MAX_FRAME_MS = 250  # longer stalls (loading, a dragged window) are dropped, not caught up
+
+
+class FixedTimestep:
+    def __init__(self, rate=SIM_RATE, max_frame_ms=MAX_FRAME_MS):
+        self.rate = rate
+        self.step_ms = 1000 / rate
+        self.max_frame_ms = max_frame_ms
+        self.reset()
+
+    def reset(self):
+        # Forget the time since the last frame, the next one gets one tick
+        self.last = None
+        self.accumulator = 0.0
+        self.alpha = 1.0
+
+    def advance(self, now):
+        # now in milliseconds -> ticks to simulate this frame. The very first
+        # frame gets one tick.
+        elapsed = self.step_ms if self.last is None else min(self.max_frame_ms, max(0.0, now - self.last))
+        self.last = now
+        self.accumulator += elapsed
+        steps = int(self.accumulator / self.step_ms + 1e-6)  # a tick's worth of float error still counts
+        self.accumulator = max(0.0, self.accumulator - steps * self.step_ms)
+        self.alpha = min(1.0, self.accumulator / self.step_ms)
+        return steps
+
+    def behind(self, value, per_tick):
+        # value as it was between the last two ticks, for something that
+        # changes by per_tick every tick
+        return value - per_tick * (1 - self.alpha)
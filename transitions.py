@@ -0,0 +1,75 @@
+# cached cross-fades between consecutive Earth stages
+#
+# A transition used to allocate fresh blend surfaces every frame and set_alpha
+# on the shared stage images (which was never undone). Here each blend step is
+# built once from copies, quantized to a fixed number of steps, and reused.
+# Display-size blends are small and kept for every pair, so a game's second
+# pass over a transition doesn't rebuild them; full-size ones (for zooming)
+# are only kept for the pair fading now.
+
+import pygame
+
+from mipmap import MipChain
+
+
+class CrossFadeFrame:
+    # Looks like a stage dict ({'high_res': ..., 'display': ...}) but only
+    # builds the sizes that are actually asked for.
+    def __init__(self, cache, index, step):
+        self.cache = cache
+        self.index = index
+        self.step = step
+
+    def __getitem__(self, key):
+        return self.cache.blend(self.index, self.step, key)
+
+
+FULL_SIZE_KEYS = ('high_res', 'mips')
+
+
+class StageCrossFade:
+    def __init__(self, stages, steps=48):
+        self.stages = stages  # dict of stage index -> {'high_res': ..., 'display': ..., 'mips': ...}
+        self.steps = steps
+        self._cache = {}  # (index, step, key) -> blend, every pair
+        self._full_size = {}  # (step, key) -> blend, for self._pair only
+        self._pair = None
+
+    def frame(self, index, progress):
+        # Blend from stage index to the next one, progress in 0..1
+        step = max(0, min(self.steps, int(progress * self.steps)))
+        return CrossFadeFrame(self, index, step)
+
+    def blend(self, index, step, key):
+        if key in FULL_SIZE_KEYS:
+            if index != self._pair:
+                self._full_size = {}
+                self._pair = index
+            cache, cache_key = self._full_size, (step, key)
+        else:
+            cache, cache_key = self._cache, (index, step, key)
+        surface = cache.get(cache_key)
+        if surface is None:
+            surface = self._build(index, step, key)
+            cache[cache_key] = surface
+        return surface
+
+    def _build(self, index, step, key):
+        if key == 'mips':
+            return MipChain(self.blend(index, step, 'high_res'))
+        current = self.stages[index][key]
+        upcoming = self.stages[(index + 1) % len(self.stages)][key]
+        progress = step / self.steps
+        blended = pygame.Surface(current.get_size(), pygame.SRCALPHA)
+        # Fade copies so the shared stage images keep their own alpha untouched
+        for image, alpha in ((current, int(255 * (1 - progress))), (upcoming, int(255 * progress))):
+            layer = image.copy()
+            layer.set_alpha(alpha)
+            blended.blit(layer, (0, 0))
+        return blended
+
+    def prepare(self, index, key='display'):
+        # Builds every step of a pair ahead of time. Safe to run on a loader
+        # thread for display-size blends: the stage images are only read.
+        for step in range(self.steps + 1):
+            self.blend(index, step, key)